@@ -18,6 +18,13 @@ from .serializers import (
 
 from rest_framework.decorators import action
 from rest_framework.views import APIView
+from product.exports import (
+    ORDER_EXPORT_FIELDS,
+    export_response,
+    parse_bool,
+    parse_date_range,
+    parse_export_format,
+)
 
 
 # register user
@@ -281,7 +288,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         return OrderModel.objects.filter(user=self.request.user)
 
     def get_permissions(self):
-        if self.action in ["update", "partial_update"]:
+        if self.action in ["update", "partial_update", "export"]:
             permission_classes = [permissions.IsAdminUser]
         else:
             permission_classes = [permissions.IsAuthenticated]
@@ -301,6 +308,18 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(order)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        """Stream orders as CSV or JSONL, filtered by payment date and status"""
+        params = request.query_params
+        fmt = parse_export_format(params)
+        orders = OrderModel.objects.filter(**parse_date_range(params, "paid_at"))
+        for name, field in (("paid", "paid_status"), ("delivered", "is_delivered")):
+            value = parse_bool(params, name)
+            if value is not None:
+                orders = orders.filter(**{field: value})
+        return export_response(orders, ORDER_EXPORT_FIELDS, fmt, "orders")
+
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAdminUser])
     def mark_delivered(self, request, pk=None):
         order = get_object_or_404(OrderModel, id=pk)
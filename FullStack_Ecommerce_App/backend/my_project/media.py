@@ -0,0 +1,152 @@
+"""Serving of user uploaded media.
+
+Replaces django.views.static.serve, which reads every byte through a Python
+worker and knows nothing of ranges or caching. With MEDIA_SENDFILE set the
+view only checks the path and answers with a header telling the web server
+which file to send; otherwise it answers conditional and range requests
+itself so unchanged files cost a 304 and seeks cost only the bytes asked for.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Not found.")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("Not found.")
+    if not os.path.isfile(full_path):
+        raise Http404("Not found.")
+
+    etag = '"%x-%x"' % (stat.st_size, stat.st_mtime_ns)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or "application/octet-stream"
+        if settings.MEDIA_SENDFILE:
+            response = sendfile_response(path, full_path, content_type)
+        else:
+            response = file_response(
+                request, full_path, stat.st_size, content_type, etag, last_modified
+            )
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    response.headers["Cache-Control"] = cache_control(path)
+    return response
+
+
+def cache_control(path):
+    # content-addressed files never change under the same name
+    if path.startswith(tuple(settings.MEDIA_IMMUTABLE_PREFIXES)):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+
+
+def sendfile_response(path, full_path, content_type):
+    """Empty response whose header makes the web server send the file"""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == "x-accel-redirect":
+        # nginx resolves this against an `internal` location aliasing MEDIA_ROOT
+        prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/")
+        response.headers["X-Accel-Redirect"] = f"{prefix}/{quote(path)}"
+    else:
+        response.headers["X-Sendfile"] = os.path.abspath(full_path)
+    return response
+
+
+def file_response(request, full_path, size, content_type, etag, last_modified):
+    byte_range = requested_range(request, size, etag, last_modified)
+    if byte_range is None:
+        # FileResponse lets the WSGI server use its file wrapper (sendfile)
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+    elif byte_range == "unsatisfiable":
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        return response
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(full_path, start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response.headers["Content-Length"] = str(end - start + 1)
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
+
+def requested_range(request, size, etag, last_modified):
+    """(first byte, last byte) asked for by the Range header.
+
+    None means the whole file: no or an unparsable Range header, several
+    ranges (allowed to be ignored) or an If-Range that no longer matches.
+    """
+    header = request.headers.get("Range")
+    if not header:
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range:
+        if if_range.startswith(('"', 'W/"')):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        # suffix range: the last N bytes
+        if not last:
+            return None
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return "unsatisfiable"
+    if start > end:
+        return None
+    return start, end
+
+
+def read_range(full_path, start, end):
+    with open(full_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
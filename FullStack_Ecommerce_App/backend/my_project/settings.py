@@ -99,10 +99,100 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # wait for the write lock under contention instead of failing at once
+        "OPTIONS": {"timeout": 20},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# LocMemCache is private to each worker process, catalog versions included:
+# a write invalidates the cached responses of the worker that made it only.
+# Under a multi-worker server use a shared backend (FileBasedCache, Redis,
+# Memcached) and raise CATALOG_CACHE_TIMEOUT.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ecommerce-catalog",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# seconds a cached catalog response lives (writes invalidate it sooner). With
+# the per-process LocMemCache this is also how long other workers may serve
+# a product after it changed; an hour is fine once the cache is shared.
+CATALOG_CACHE_TIMEOUT = 30
+
+
+# product name autocomplete (in-process prefix index)
+SUGGEST_INDEX_MAX_PRODUCTS = 200000
+SUGGEST_INDEX_MAX_AGE = 300  # seconds, picks up writes made by other workers
+SUGGEST_MAX_RESULTS = 20
+
+
+# bulk product import
+IMPORT_BATCH_SIZE = 1000  # rows validated and written per transaction
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+# bulk product edits (/api/product-bulk-update/), one transaction per request
+PRODUCT_BULK_EDIT_MAX_ITEMS = 500
+
+
+# streaming CSV/JSONL exports
+EXPORT_CHUNK_SIZE = 2000  # rows fetched from the database per round trip
+
+
+# product image variants, rendered with Pillow in a process pool
+PRODUCT_IMAGE_VARIANTS = {
+    "thumbnail": (200, 200),
+    "card": (400, 400),
+    "large": (800, 800),
+}
+IMAGE_VARIANT_QUALITY = 82
+IMAGE_VARIANT_WORKERS = 2  # worker processes; 0 renders inline after the request
+
+
+# content-addressed storage for product images and report evidence
+BLOB_STORAGE_DIR = "blobs"  # under MEDIA_ROOT
+BLOB_GC_GRACE_SECONDS = 24 * 3600  # unreferenced blobs are kept this long
+
+
+# inventory
+STOCK_RESERVATION_TTL = 15 * 60  # seconds a checkout may hold units unpaid
+STOCK_UPDATE_RETRIES = 3  # conditional updates retried when a race moved the row
+
+
+# product view counters, buffered per process (bounds what a crash can lose)
+VIEW_COUNTER_FLUSH_SIZE = 1000  # hits
+VIEW_COUNTER_FLUSH_INTERVAL = 10  # seconds
+
+
+# rating submissions: product aggregates are written behind, per process
+RATING_AGGREGATE_FLUSH_SIZE = 500  # ratings
+RATING_AGGREGATE_FLUSH_INTERVAL = 2  # seconds until the aggregates catch up
+
+
+# homepage leaderboards
+LEADERBOARD_MAX_RESULTS = 50
+TRENDING_WINDOW_DAYS = 7
+TOP_RATED_PRIOR_MEAN = 3.0  # top rated ranks ratings pulled towards this mean
+TOP_RATED_PRIOR_RATINGS = 5  # by as much as this many ratings would
+
+
+# "customers also bought", rebuilt offline by build_similar_products
+SIMILAR_PRODUCTS_TOP_K = 10
+SIMILAR_PRODUCTS_MIN_SUPPORT = 2  # customers who must have bought both products
+SIMILAR_PRODUCTS_MAX_BASKET = 200  # most recent products counted per customer
+
+
+# catalog change feed for syncing clients (/api/products/changes/)
+PRODUCT_CHANGES_PAGE_SIZE = 100
+PRODUCT_CHANGES_MAX_PAGE_SIZE = 1000
+PRODUCT_TOMBSTONE_RETENTION_DAYS = 90  # older sync tokens must resync
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -165,6 +255,34 @@ REST_FRAMEWORK = {
     )
 }
 
+# product listing (cursor pagination)
+PRODUCT_PAGE_SIZE = 20
+PRODUCT_MAX_PAGE_SIZE = 100
+
+# ratings of a single product (cursor pagination)
+RATING_PAGE_SIZE = 10
+RATING_MAX_PAGE_SIZE = 100
+
+
+# report moderation queue (cursor pagination, bulk status changes)
+REPORT_PAGE_SIZE = 50
+REPORT_MAX_PAGE_SIZE = 200
+REPORT_TRANSITION_MAX_IDS = 1000
+# report evidence uploads, streamed into the blob storage (product.uploads)
+REPORT_EVIDENCE_MAX_SIZE = 100 * 1024 * 1024  # bytes
+REPORT_EVIDENCE_CONTENT_TYPES = [
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "application/pdf",
+    "video/mp4",
+    "video/quicktime",
+]
+# near-duplicate report clusters (MinHash + LSH); changing these needs a
+# rebuild_report_clusters run
+REPORT_MINHASH_BANDS = 16
+REPORT_MINHASH_ROWS = 4  # rows per band; 16 x 4 finds pairs from ~50% similar
+REPORT_CLUSTER_SIMILARITY = 0.5  # estimated Jaccard similarity to join a cluster
 
 # STRIPE
 STRIPE_TEST_PUBLISHABLE_KEY = os.environ.get("STRIPE_TEST_PUBLISHABLE_KEY")
@@ -183,6 +301,14 @@ STATICFILES_DIRS = [
 # user uploaded media or image gets uploaded at this media root (which is static/images folder)
 MEDIA_ROOT = "static/images"
 
+# media delivery: None sends files from Django (with range and conditional
+# request support), "x-sendfile" (Apache, lighttpd) or "x-accel-redirect"
+# (nginx) only names the file and lets the web server send it
+MEDIA_SENDFILE = os.environ.get("MEDIA_SENDFILE") or None
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"  # internal nginx location
+MEDIA_CACHE_MAX_AGE = 3600  # seconds, for files that may change under their name
+MEDIA_IMMUTABLE_PREFIXES = (f"{BLOB_STORAGE_DIR}/",)  # content-addressed files
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -14,11 +14,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from my_project.media import serve_media
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("product.urls")),
@@ -27,4 +31,6 @@ urlpatterns = [
     path("notifications/", include("notifications.urls")),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# media is served in production as well, see my_project/media.py
+media_prefix = re.escape(settings.MEDIA_URL.lstrip("/"))
+urlpatterns += [re_path(rf"^{media_prefix}(?P<path>.*)$", serve_media)]
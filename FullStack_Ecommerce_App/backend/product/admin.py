@@ -1,12 +1,21 @@
 from django.contrib import admin
-from .models import Product, Rating, Report
+from .models import Product, ProductFacetCount, Rating, Report, StoredBlob
+from .moderation import transition_reports
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ("name", "price", "stock", "average_rating", "total_ratings")
+    list_display = (
+        "name", "price", "quantity", "stock", "average_rating", "total_ratings"
+    )
     search_fields = ("name", "description")
     list_filter = ("stock",)
+    # stock follows the units on hand, as in product.inventory
+    readonly_fields = ("stock",)
+
+    def save_model(self, request, obj, form, change):
+        obj.stock = obj.quantity > 0
+        super().save_model(request, obj, form, change)
 
 
 @admin.register(Rating)
@@ -22,3 +31,34 @@ class ReportAdmin(admin.ModelAdmin):
     list_filter = ("report_type", "status", "created_at")
     search_fields = ("title", "description", "user__username")
     readonly_fields = ("created_at", "updated_at")
+    actions = ("mark_investigating", "mark_resolved", "mark_closed")
+
+    def change_status(self, request, queryset, status):
+        # one UPDATE for the whole selection
+        updated = transition_reports(queryset, status)
+        self.message_user(request, f"{updated} reports marked {status.lower()}.")
+
+    @admin.action(description="Mark selected reports as under investigation")
+    def mark_investigating(self, request, queryset):
+        self.change_status(request, queryset, "INVESTIGATING")
+
+    @admin.action(description="Mark selected reports as resolved")
+    def mark_resolved(self, request, queryset):
+        self.change_status(request, queryset, "RESOLVED")
+
+    @admin.action(description="Mark selected reports as closed")
+    def mark_closed(self, request, queryset):
+        self.change_status(request, queryset, "CLOSED")
+
+
+@admin.register(ProductFacetCount)
+class ProductFacetCountAdmin(admin.ModelAdmin):
+    list_display = ("price_bucket", "rating_bucket", "in_stock", "count")
+    list_filter = ("in_stock",)
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "size", "ref_count", "last_used")
+    search_fields = ("name", "digest")
+    readonly_fields = ("name", "digest", "size", "ref_count", "last_used")
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'product'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .changes import ensure_change_triggers
+        from .search import ensure_search_triggers
+
+        post_migrate.connect(ensure_search_triggers, sender=self)
+        post_migrate.connect(ensure_change_triggers, sender=self)
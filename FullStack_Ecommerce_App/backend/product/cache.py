@@ -0,0 +1,187 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .suggest import suggest_index
+
+CATALOG_VERSION_KEY = "product:catalog-version"
+
+
+def get_counter(key, timeout=None):
+    """Read a version counter kept in the cache, creating it if needed"""
+    value = cache.get(key)
+    if value is None:
+        # seed from the clock so an evicted counter never reuses an old value
+        cache.add(key, time.time_ns(), timeout=timeout)
+        value = cache.get(key)
+    return value
+
+
+def bump_counter(key, timeout=None):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=timeout)
+
+
+def get_catalog_version():
+    """Current catalog version, every cached catalog response is keyed by it"""
+    # The version expires like the responses: with a per-process cache a
+    # worker never sees the bumps of the others, and a version it kept
+    # forever would answer 304 to its old ETags forever. Reseeded from the
+    # clock, it rolls over at least every CATALOG_CACHE_TIMEOUT seconds.
+    return get_counter(CATALOG_VERSION_KEY, settings.CATALOG_CACHE_TIMEOUT)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response at once"""
+    bump_counter(CATALOG_VERSION_KEY, settings.CATALOG_CACHE_TIMEOUT)
+
+
+def catalog_etag(request, version):
+    # a (catalog version, URL, media type) triple always renders the same bytes,
+    # so it is safe to use as a strong validator without hashing the body
+    key = f"{version}:{request.accepted_media_type}:{request.build_absolute_uri()}"
+    return '"%s"' % hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def cache_catalog_response(view_method):
+    """Serve a catalog GET from the cache, answering If-None-Match with 304.
+
+    Only successful responses are cached. Entries are never invalidated one
+    by one: bumping the catalog version simply makes them unreachable.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        etag = catalog_etag(request, get_catalog_version())
+
+        if_none_match = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+
+        cache_key = f"product:catalog:{etag}"
+        data = cache.get(cache_key)
+        if data is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(cache_key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        else:
+            response = Response(data, status=status.HTTP_200_OK)
+
+        response["ETag"] = etag
+        return response
+
+    return wrapper
+
+
+class SingleFlightCache:
+    """Read-through cache where only one worker rebuilds a missing entry.
+
+    Entries carry the generation they were built for, so invalidating a key
+    only bumps its generation and leaves the old value around as a stale
+    copy. While one worker holds the rebuild lock the others return that
+    stale copy, or wait for the fresh one when there is nothing to serve.
+    """
+
+    lock_timeout = 10  # seconds before a crashed builder's lock expires
+    wait_timeout = 5  # seconds a waiter polls before building by itself
+    poll_interval = 0.02
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        generation = get_counter(self._key("gen", key))
+        entry = cache.get(self._key("data", key))
+        if entry is not None and entry[0] == generation:
+            self._count("hits")
+            return entry[1]
+
+        lock_key = self._key("lock", key)
+        if cache.add(lock_key, 1, self.lock_timeout):
+            self._count("misses")
+            try:
+                data = build()
+                cache.set(
+                    self._key("data", key),
+                    (generation, data),
+                    settings.CATALOG_CACHE_TIMEOUT,
+                )
+            finally:
+                cache.delete(lock_key)
+            return data
+
+        if entry is not None:
+            self._count("stale")
+            return entry[1]
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            entry = cache.get(self._key("data", key))
+            if entry is not None:
+                self._count("coalesced")
+                return entry[1]
+
+        self._count("misses")
+        return build()
+
+    def invalidate(self, key):
+        bump_counter(self._key("gen", key))
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                name: self.stats[name]
+                for name in ("hits", "misses", "coalesced", "stale")
+            }
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _key(self, kind, key):
+        return f"{self.prefix}:{kind}:{key}"
+
+
+product_detail_cache = SingleFlightCache("product:detail")
+
+
+def invalidate_catalog(product_ids=(), refresh_suggestions=False):
+    """Drop cached catalog responses and the details of `product_ids`.
+
+    Called by the model signals and by every write that sends none (queryset
+    updates, bulk writes). Everything is dropped now and again once the
+    transaction commits, or a reader racing it could cache the old rows
+    under the new version.
+    """
+    product_ids = list(product_ids)
+
+    def invalidate():
+        bump_catalog_version()
+        for product_id in product_ids:
+            product_detail_cache.invalidate(product_id)
+
+    def refresh_suggestions_now():
+        for product_id in product_ids:
+            suggest_index.refresh_product(product_id)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+    if refresh_suggestions:
+        transaction.on_commit(refresh_suggestions_now)
@@ -0,0 +1,166 @@
+import datetime
+import heapq
+import itertools
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+
+from .models import Product, ProductChangeSequence, ProductTombstone
+
+# Catalog change feed for clients that keep a local copy of the catalog.
+#
+# Database triggers (migration 0024) stamp every product write with the next
+# value of a counter and turn every delete into a tombstone under one, so
+# "what changed since N" is a range scan over the change_seq indexes of the
+# two tables. A sync token is the counter value the client has caught up to.
+
+SEQUENCE_TABLE = "product_productchangesequence"
+NEXT_SEQ = f"""
+    INSERT INTO {SEQUENCE_TABLE} (id, value, purged_through)
+    VALUES (1, 1, 0)
+    ON CONFLICT (id) DO UPDATE SET value = value + 1;
+"""
+CURRENT_SEQ = f"(SELECT value FROM {SEQUENCE_TABLE} WHERE id = 1)"
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# the columns ProductSerializer shows; stock counts alone are not a change
+SYNCED_COLUMNS = (
+    "sku, name, description, price, stock, image, image_variants, "
+    "average_rating, total_ratings, rating_count_1, rating_count_2, "
+    "rating_count_3, rating_count_4, rating_count_5"
+)
+
+# Same triggers as the migration; like the search triggers they are lost
+# whenever Django rebuilds product_product and are put back after migrate.
+CHANGE_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_changes_ai AFTER INSERT ON product_product
+    BEGIN
+        {NEXT_SEQ}
+        UPDATE product_product SET change_seq = {CURRENT_SEQ} WHERE id = new.id;
+        DELETE FROM product_producttombstone WHERE product_id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_changes_au
+    AFTER UPDATE OF {SYNCED_COLUMNS} ON product_product
+    BEGIN
+        {NEXT_SEQ}
+        UPDATE product_product
+        SET change_seq = {CURRENT_SEQ},
+            updated_at = CASE WHEN new.updated_at IS old.updated_at
+                THEN {NOW} ELSE new.updated_at END
+        WHERE id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_changes_ad AFTER DELETE ON product_product
+    BEGIN
+        {NEXT_SEQ}
+        INSERT OR REPLACE INTO product_producttombstone
+            (product_id, change_seq, deleted_at)
+        VALUES (old.id, {CURRENT_SEQ}, {NOW});
+    END
+    """,
+]
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Sync token is too old or unknown, download the catalog again."
+    default_code = "sync_token_expired"
+
+
+def ensure_change_triggers(using="default", **kwargs):
+    """post_migrate hook putting back triggers lost to a table rebuild"""
+    db = connections[using]
+    if db.vendor != "sqlite" or SEQUENCE_TABLE not in db.introspection.table_names():
+        return
+    with db.cursor() as cursor:
+        for statement in CHANGE_TRIGGERS_SQL:
+            cursor.execute(statement)
+
+
+def parse_sync_token(params):
+    """The counter value in `?since=`, 0 (a full download) when there is none"""
+    token = params.get("since")
+    if not token:
+        return 0
+    try:
+        since = int(token)
+    except ValueError:
+        raise ParseError("Invalid sync token.")
+    if since < 0:
+        raise ParseError("Invalid sync token.")
+    return since
+
+
+def current_sequence():
+    sequence = ProductChangeSequence.objects.filter(pk=1).first()
+    return sequence or ProductChangeSequence(pk=1)
+
+
+def changes_since(since, limit):
+    """Products written and ids deleted after `since`, oldest change first.
+
+    Returns (products, deleted ids, next token, whether more changes are
+    waiting). A token of 0 downloads the whole catalog without tombstones.
+    """
+    sequence = current_sequence()
+    if since > sequence.value or 0 < since < sequence.purged_through:
+        # a deletion the client has not seen may have been purged
+        raise SyncTokenExpired()
+
+    # stop at the counter read above, so the token covers what is returned
+    window = {"change_seq__gt": since, "change_seq__lte": sequence.value}
+    products = (
+        (product.change_seq, product)
+        for product in Product.objects.filter(**window).order_by("change_seq")[
+            : limit + 1
+        ]
+    )
+    tombstones = (
+        ProductTombstone.objects.filter(**window)
+        .order_by("change_seq")
+        .values_list("change_seq", "product_id")[: limit + 1]
+        if since
+        else []
+    )
+    changes = list(
+        itertools.islice(
+            heapq.merge(products, tombstones, key=itemgetter(0)), limit + 1
+        )
+    )
+    more = len(changes) > limit
+    changes = changes[:limit]
+
+    changed = [item for _, item in changes if isinstance(item, Product)]
+    deleted = [item for _, item in changes if not isinstance(item, Product)]
+    token = changes[-1][0] if more else sequence.value
+    return changed, deleted, token, more
+
+
+def purge_tombstones(days=None):
+    """Forget deletions older than PRODUCT_TOMBSTONE_RETENTION_DAYS.
+
+    Clients holding a token from before the last purged tombstone get 410
+    from the change feed and download the catalog again.
+    """
+    if days is None:
+        days = settings.PRODUCT_TOMBSTONE_RETENTION_DAYS
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    expired = ProductTombstone.objects.filter(deleted_at__lt=cutoff)
+    purged_through = expired.aggregate(last=Max("change_seq"))["last"]
+    if purged_through is None:
+        return 0
+    # tokens are refused before the tombstones go, never the other way round
+    ProductChangeSequence.objects.filter(
+        pk=1, purged_through__lt=purged_through
+    ).update(purged_through=purged_through)
+    deleted, _ = expired.filter(change_seq__lte=purged_through).delete()
+    return deleted
@@ -0,0 +1,204 @@
+import functools
+import hashlib
+import random
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from .importer import chunked
+from .models import Report, ReportBucket, ReportCluster
+
+# Near-duplicate reports are grouped with MinHash and locality-sensitive
+# hashing. A report's word shingles are reduced to a signature of
+# REPORT_MINHASH_BANDS * REPORT_MINHASH_ROWS minimum hashes, where two
+# signatures agree in about the Jaccard similarity of the two texts. Each
+# band of rows hashes to one bucket; a new report only compares itself with
+# the clusters of its product it shares a bucket with, found by an indexed
+# IN lookup, however many reports there are.
+
+SHINGLE_SIZE = 3
+MERSENNE_PRIME = (1 << 61) - 1
+WORD_RE = re.compile(r"\w+")
+
+
+@functools.lru_cache(maxsize=None)
+def hash_functions(count):
+    # fixed seed: signatures must agree across processes and rebuilds
+    rng = random.Random(count)
+    return [
+        (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+        for _ in range(count)
+    ]
+
+
+def stable_hash(text):
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def shingles(text):
+    """Overlapping runs of SHINGLE_SIZE words, ignoring case and punctuation"""
+    words = WORD_RE.findall(text.casefold())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(title, description):
+    """MinHash signature of a report's text"""
+    hashes = [
+        stable_hash(shingle) % MERSENNE_PRIME
+        for shingle in shingles(f"{title} {description}")
+    ]
+    count = settings.REPORT_MINHASH_BANDS * settings.REPORT_MINHASH_ROWS
+    return [
+        min((a * value + b) % MERSENNE_PRIME for value in hashes)
+        for a, b in hash_functions(count)
+    ]
+
+
+def band_buckets(signature):
+    """Bucket keys of a signature, one per band"""
+    rows = settings.REPORT_MINHASH_ROWS
+    return [
+        # the band number is hashed in, equal rows in other bands do not match
+        stable_hash(f"{band}:" + ",".join(map(str, signature[start : start + rows])))
+        for band, start in enumerate(range(0, len(signature), rows))
+    ]
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    if len(first) != len(second):
+        return 0.0  # made with other settings; the rebuild redoes them
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def best_match(signature, candidates):
+    """Position of the closest candidate signature, None if none is close enough"""
+    best, best_score = None, settings.REPORT_CLUSTER_SIMILARITY
+    for position, candidate in enumerate(candidates):
+        score = similarity(signature, candidate)
+        if score >= best_score:
+            best, best_score = position, score
+    return best
+
+
+def assign_cluster(report):
+    """Attach a new report to a cluster of near-duplicates, or start one"""
+    signature = minhash(report.title, report.description)
+    buckets = band_buckets(signature)
+
+    with transaction.atomic():
+        candidates = list(
+            ReportCluster.objects.filter(
+                pk__in=ReportBucket.objects.filter(
+                    product=report.product_id, bucket__in=buckets
+                ).values("cluster_id")
+            )
+        )
+        best = best_match(signature, [cluster.signature for cluster in candidates])
+        if best is not None:
+            cluster = candidates[best]
+        else:
+            cluster = ReportCluster.objects.create(
+                product_id=report.product_id,
+                report_type=report.report_type,
+                title=report.title,
+                signature=signature,
+                created_at=report.created_at,
+            )
+            ReportBucket.objects.bulk_create(
+                ReportBucket(
+                    cluster=cluster, product_id=report.product_id, bucket=bucket
+                )
+                for bucket in buckets
+            )
+        # an update, so saving the report does not cluster it again
+        Report.objects.filter(pk=report.pk).update(cluster=cluster)
+    report.cluster = cluster
+    return cluster
+
+
+def rebuild_clusters(chunk_size=2000):
+    """Cluster every report again from scratch, oldest first.
+
+    The LSH index is kept in memory while the reports are streamed, and the
+    result is written with bulk inserts and one UPDATE per cluster.
+    """
+    index = defaultdict(list)  # (product id, bucket) -> cluster positions
+    clusters, buckets_of, members = [], [], []
+    reports = Report.objects.order_by("id").values_list(
+        "id", "product_id", "report_type", "title", "description", "created_at"
+    )
+    for report_id, product_id, report_type, title, description, created_at in (
+        reports.iterator(chunk_size=chunk_size)
+    ):
+        signature = minhash(title, description)
+        buckets = band_buckets(signature)
+        positions = sorted(
+            {
+                position
+                for bucket in buckets
+                for position in index.get((product_id, bucket), ())
+            }
+        )
+        best = best_match(signature, [clusters[i].signature for i in positions])
+        if best is not None:
+            members[positions[best]].append(report_id)
+            continue
+
+        for bucket in buckets:
+            index[product_id, bucket].append(len(clusters))
+        clusters.append(
+            ReportCluster(
+                product_id=product_id,
+                report_type=report_type,
+                title=title,
+                signature=signature,
+                created_at=created_at,
+            )
+        )
+        buckets_of.append(buckets)
+        members.append([report_id])
+
+    with transaction.atomic():
+        Report.objects.update(cluster=None)
+        ReportBucket.objects.all().delete()
+        ReportCluster.objects.all().delete()
+        ReportCluster.objects.bulk_create(clusters, batch_size=500)
+        ReportBucket.objects.bulk_create(
+            (
+                ReportBucket(
+                    cluster=cluster, product_id=cluster.product_id, bucket=bucket
+                )
+                for cluster, buckets in zip(clusters, buckets_of)
+                for bucket in buckets
+            ),
+            batch_size=1000,
+        )
+        for cluster, report_ids in zip(clusters, members):
+            for batch in chunked(report_ids, 500):
+                Report.objects.filter(pk__in=batch).update(cluster=cluster)
+    return len(clusters)
+
+
+def cluster_queue(status, report_type=None, product_id=None, cluster_id=None):
+    """Clusters with reports in `status`, counting those reports"""
+    reports = Q(reports__status=status)
+    if report_type is not None:
+        reports &= Q(reports__report_type=report_type)
+    clusters = ReportCluster.objects.filter(reports)
+    if product_id is not None:
+        clusters = clusters.filter(product_id=product_id)
+    if cluster_id is not None:
+        clusters = clusters.filter(pk=cluster_id)
+    return clusters.annotate(
+        report_count=Count("reports"), last_reported_at=Max("reports__created_at")
+    )
@@ -0,0 +1,148 @@
+import atexit
+import collections
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from .models import Product, ProductViewCount
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedCounter:
+    """Counts gathered in process memory and written in batches.
+
+    record() only bumps a dict entry. The request that finds the buffer
+    holding `flush_size` hits, or older than `flush_interval` seconds (both
+    setting names), hands it to `write`, which must add the counts to what
+    is stored so any number of worker processes can flush side by side. A
+    crashed process loses at most one buffer; a clean exit flushes it. With
+    `timer`, a background thread also flushes a buffer once it is
+    `flush_interval` old, for counts that must not wait for the next hit.
+    """
+
+    def __init__(
+        self,
+        write,
+        flush_size="VIEW_COUNTER_FLUSH_SIZE",
+        flush_interval="VIEW_COUNTER_FLUSH_INTERVAL",
+        timer=False,
+    ):
+        self._write = write
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._use_timer = timer
+        self._timer = None
+        self._lock = threading.Lock()
+        self._pending = collections.Counter()
+        self._pending_hits = 0
+        self._pid = None
+        self._last_flush = time.monotonic()
+        self._stats = {"flushes": 0, "flushed_hits": 0, "failed_flushes": 0}
+
+    def record(self, key, hits=1):
+        self.add({key: hits}, hits)
+
+    def add(self, counts, hits=1):
+        """Buffer several counts that together make up `hits` hits"""
+        self._ensure_started()
+        interval = getattr(settings, self._flush_interval)
+        with self._lock:
+            self._pending.update(counts)
+            self._pending_hits += hits
+            due = (
+                self._pending_hits >= getattr(settings, self._flush_size)
+                or time.monotonic() - self._last_flush >= interval
+            )
+            if self._use_timer and not due and self._timer is None:
+                self._timer = threading.Timer(interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered counts; returns the number of hits written"""
+        with self._lock:
+            pending, self._pending = self._pending, collections.Counter()
+            hits, self._pending_hits = self._pending_hits, 0
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        try:
+            self._write(pending)
+        except OperationalError:
+            # database busy: keep the counts for the next flush
+            logger.exception("Could not flush %s buffered hits", hits)
+            with self._lock:
+                self._pending.update(pending)
+                self._pending_hits += hits
+                self._stats["failed_flushes"] += 1
+            return 0
+
+        with self._lock:
+            self._stats["flushes"] += 1
+            self._stats["flushed_hits"] += hits
+        return hits
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # the timer thread's own database connection
+            connection.close()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "pending_hits": self._pending_hits,
+                "pending_keys": len(self._pending),
+                **self._stats,
+            }
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # a forked worker: what was buffered belongs to the parent
+                self._pending.clear()
+                self._pending_hits = 0
+                self._timer = None  # threads do not survive a fork
+            self._pid = pid
+        atexit.register(self.flush)
+
+
+def write_view_counts(counts):
+    """Add {product id: hits} to the counters table in one transaction"""
+    with transaction.atomic():
+        # hits on products deleted since they were counted are dropped
+        product_ids = set(
+            Product.objects.filter(pk__in=list(counts)).values_list("pk", flat=True)
+        )
+        if not product_ids:
+            return
+        ProductViewCount.objects.bulk_create(
+            [ProductViewCount(product_id=product_id) for product_id in product_ids],
+            ignore_conflicts=True,
+        )
+        table = connection.ops.quote_name(ProductViewCount._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {table} SET views = views + %s WHERE product_id = %s",
+                [(counts[product_id], product_id) for product_id in product_ids],
+            )
+
+
+view_counter = BufferedCounter(write_view_counts)
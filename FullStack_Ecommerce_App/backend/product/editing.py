@@ -0,0 +1,75 @@
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import invalidate_catalog
+from .models import Product, move_facet_cell
+
+# fields an admin may change for many products at once
+BULK_EDIT_FIELDS = ["price", "description", "quantity"]
+
+# Edits are optimistic: a client sends the version of the product it based
+# the edit on, and the edit is applied only if that is still the stored
+# version. Rows are locked just for the few statements of the transaction
+# that compares and writes them, never while an admin is editing, and a
+# product someone else saved in the meantime is reported rather than
+# overwritten.
+
+
+class EditConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Product was changed since it was read, reload it and try again."
+    default_code = "edit_conflict"
+
+
+def bulk_edit_products(edits):
+    """Apply edits to many products in one transaction.
+
+    `edits` maps product ids to {"version": version the edit is based on,
+    field: new value} with fields from BULK_EDIT_FIELDS. The products whose
+    version matches are written with a single bulk_update(). Returns
+    (updated, conflicts, missing): the new versions of the edited products,
+    the current versions of the products that had moved on, and the ids of
+    products that no longer exist.
+    """
+    edited_fields = {field for edit in edits.values() for field in edit}
+    fields = [field for field in BULK_EDIT_FIELDS if field in edited_fields]
+    if "quantity" in fields:
+        fields.append("stock")  # follows the units on hand, as in product.inventory
+
+    updated, conflicts, cells = {}, {}, []
+    with transaction.atomic():
+        products = Product.objects.select_for_update().only(
+            "version", "price", "description", "quantity", "stock", "average_rating"
+        )
+        stored = {product.pk: product for product in products.filter(pk__in=edits)}
+        changed = []
+        for product_id, edit in edits.items():
+            product = stored.get(product_id)
+            if product is None:
+                continue
+            if product.version != edit["version"]:
+                conflicts[product_id] = product.version
+                continue
+            old_cell = product.facet_cell()
+            for field in BULK_EDIT_FIELDS:
+                if field in edit:
+                    setattr(product, field, edit[field])
+            if "quantity" in edit:
+                product.stock = product.quantity > 0
+            product.version += 1
+            cells.append((old_cell, product.facet_cell()))
+            changed.append(product)
+            updated[product_id] = product.version
+
+        if changed:
+            # queryset writes send no signals; the change feed triggers still
+            # fire and stamp updated_at
+            Product.objects.bulk_update(changed, fields + ["version"])
+            for old_cell, new_cell in cells:
+                move_facet_cell(old_cell, new_cell)
+
+    if updated:
+        invalidate_catalog(updated)
+    missing = [product_id for product_id in edits if product_id not in stored]
+    return updated, conflicts, missing
@@ -0,0 +1,145 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+from rest_framework.exceptions import ParseError
+
+from .models import PRICE_BUCKETS, Product, ProductFacetCount
+
+RATING_BUCKETS = range(0, 6)
+
+
+def parse_filters(params):
+    """Listing filters from the query string: min/max price, stock and min rating"""
+    filters = {}
+    for name in ("min_price", "max_price", "min_rating"):
+        if params.get(name):
+            try:
+                value = Decimal(params[name])
+            except InvalidOperation:
+                raise ParseError(f"'{name}' must be a number.")
+            # NaN and Infinity parse, but no database column can compare them
+            if not value.is_finite():
+                raise ParseError(f"'{name}' must be a number.")
+            filters[name] = value
+
+    in_stock = params.get("in_stock", "").lower()
+    if in_stock in ("true", "1"):
+        filters["in_stock"] = True
+    elif in_stock in ("false", "0"):
+        filters["in_stock"] = False
+    elif in_stock:
+        raise ParseError("'in_stock' must be true or false.")
+    return filters
+
+
+def filter_products(
+    products, min_price=None, max_price=None, in_stock=None, min_rating=None
+):
+    if min_price is not None:
+        products = products.filter(price__gte=min_price)
+    if max_price is not None:
+        products = products.filter(price__lte=max_price)
+    if in_stock is not None:
+        products = products.filter(stock=in_stock)
+    if min_rating is not None:
+        products = products.filter(average_rating__gte=min_rating)
+    return products
+
+
+def price_bucket_bounds(bucket):
+    upper = PRICE_BUCKETS[bucket + 1] if bucket + 1 < len(PRICE_BUCKETS) else None
+    return PRICE_BUCKETS[bucket], upper
+
+
+def facet_counts(min_price=None, max_price=None, in_stock=None, min_rating=None):
+    """Product counts per price bucket, rating bucket and stock state.
+
+    Each facet is narrowed by the *other* active filters, the usual behaviour
+    for filter sidebars. Counts come from the ProductFacetCount summary, so
+    filters are applied at bucket granularity: a bucket counts as soon as it
+    overlaps the requested range.
+    """
+
+    def price_matches(bucket):
+        lower, upper = price_bucket_bounds(bucket)
+        return (max_price is None or lower <= max_price) and (
+            min_price is None or upper is None or upper > min_price
+        )
+
+    def rating_matches(bucket):
+        # bucket b holds averages in [b, b + 1), the top bucket exactly 5
+        return min_rating is None or bucket + 1 > min_rating or bucket >= min_rating
+
+    def stock_matches(stock):
+        return in_stock is None or stock == in_stock
+
+    price = dict.fromkeys(range(len(PRICE_BUCKETS)), 0)
+    rating = dict.fromkeys(RATING_BUCKETS, 0)
+    stock = {True: 0, False: 0}
+    cells = ProductFacetCount.objects.filter(count__gt=0).values_list(
+        "price_bucket", "rating_bucket", "in_stock", "count"
+    )
+    for price_bucket, rating_bucket, cell_in_stock, count in cells:
+        matches = (
+            price_matches(price_bucket),
+            rating_matches(rating_bucket),
+            stock_matches(cell_in_stock),
+        )
+        if matches[1] and matches[2]:
+            price[price_bucket] += count
+        if matches[0] and matches[2]:
+            rating[rating_bucket] += count
+        if matches[0] and matches[1]:
+            stock[cell_in_stock] += count
+
+    price_facet = []
+    for bucket, count in price.items():
+        lower, upper = price_bucket_bounds(bucket)
+        price_facet.append({"min": lower, "max": upper, "count": count})
+
+    return {
+        "price": price_facet,
+        "rating": [
+            {"min_rating": bucket, "count": rating[bucket]} for bucket in RATING_BUCKETS
+        ],
+        "stock": {"in_stock": stock[True], "out_of_stock": stock[False]},
+    }
+
+
+def rebuild_facet_counts():
+    """Recount every facet cell from the product table with one grouped query"""
+    price_bucket = Case(
+        *[
+            When(price__gte=lower, then=Value(bucket))
+            for bucket, lower in reversed(list(enumerate(PRICE_BUCKETS)))
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    rating_bucket = Case(
+        *[
+            When(average_rating__gte=bucket, then=Value(bucket))
+            for bucket in reversed(RATING_BUCKETS)
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    rows = (
+        Product.objects.annotate(p=price_bucket, r=rating_bucket)
+        .values("p", "r", "stock")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        ProductFacetCount.objects.all().delete()
+        ProductFacetCount.objects.bulk_create(
+            ProductFacetCount(
+                price_bucket=row["p"],
+                rating_bucket=row["r"],
+                in_stock=row["stock"],
+                count=row["n"],
+            )
+            for row in rows
+        )
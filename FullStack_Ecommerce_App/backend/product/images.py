@@ -0,0 +1,110 @@
+import glob
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from .cache import invalidate_catalog
+from .imaging import render_variants
+from .models import Product
+
+VARIANTS_DIR = "variants"
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process pool shared by every request of this worker, started on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawned, not forked: a fork copies whatever locks this
+            # worker's other threads hold (logging, database) into the child
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def variant_job(image_name):
+    """Arguments for render_variants(); plain paths so workers need no Django"""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return (
+        default_storage.path(image_name),
+        default_storage.path(VARIANTS_DIR),
+        stem,
+        settings.PRODUCT_IMAGE_VARIANTS,
+        settings.IMAGE_VARIANT_QUALITY,
+    )
+
+
+def delete_variants(image_name):
+    """Remove the rendered copies of an image that is gone from storage"""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    pattern = os.path.join(default_storage.path(VARIANTS_DIR), glob.escape(stem) + "-*")
+    for path in glob.glob(pattern):
+        os.remove(path)
+
+
+def save_variants(product_id, image_name, files):
+    """Record rendered variants; returns False if the image changed meanwhile"""
+    variants = {
+        size_name: {
+            fmt: f"{VARIANTS_DIR}/{filename}" for fmt, filename in by_format.items()
+        }
+        for size_name, by_format in files.items()
+    }
+    # a newer upload may have replaced the image while this one was rendering
+    updated = Product.objects.filter(pk=product_id, image=image_name).update(
+        image_variants=variants
+    )
+    if updated:
+        # a queryset update sends no signals
+        invalidate_catalog([product_id])
+    return bool(updated)
+
+
+def generate_variants(product_id, image_name):
+    """Render and record the variants of one image in the calling process"""
+    files = render_variants(*variant_job(image_name))
+    return save_variants(product_id, image_name, files)
+
+
+def schedule_variants(product):
+    """Render the product's image variants off the request path after commit"""
+    if not product.image:
+        return
+    product_id, image_name = product.pk, product.image.name
+    transaction.on_commit(partial(submit_variants, product_id, image_name))
+
+
+def submit_variants(product_id, image_name):
+    if not settings.IMAGE_VARIANT_WORKERS:
+        try:
+            generate_variants(product_id, image_name)
+        except Exception:
+            logger.exception("Could not render variants of %s", image_name)
+        return
+
+    future = get_executor().submit(render_variants, *variant_job(image_name))
+    future.add_done_callback(partial(variants_rendered, product_id, image_name))
+
+
+def variants_rendered(product_id, image_name, future):
+    # runs on the pool's result thread, which has its own database connection
+    try:
+        save_variants(product_id, image_name, future.result())
+    except Exception:
+        logger.exception("Could not render variants of %s", image_name)
+    finally:
+        connection.close()
@@ -0,0 +1,57 @@
+"""Pillow resizing for product image variants.
+
+This runs inside worker processes, so it deliberately imports nothing from
+Django: the caller hands in absolute paths and gets plain file names back.
+"""
+
+import os
+
+from PIL import Image, ImageOps
+
+# variant format -> (Pillow format, file extension)
+VARIANT_FORMATS = {
+    "jpeg": ("JPEG", "jpg"),
+    "webp": ("WEBP", "webp"),
+}
+
+
+def render_variants(source_path, output_dir, stem, sizes, quality=82):
+    """Write every size of the image in every variant format.
+
+    Each variant is scaled down to fit its box (never up) and returned as
+    {size name: {format: file name}} relative to output_dir.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        base = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {}
+    for size_name, box in sizes.items():
+        resized = base.copy()
+        resized.thumbnail(tuple(box), Image.LANCZOS)
+        variants[size_name] = {}
+        for fmt, (pil_format, extension) in VARIANT_FORMATS.items():
+            filename = f"{stem}-{size_name}.{extension}"
+            output = resized
+            if pil_format == "JPEG" and resized.mode == "RGBA":
+                output = flatten(resized)
+            path = os.path.join(output_dir, filename)
+            write_atomic(output, path, pil_format, quality)
+            variants[size_name][fmt] = filename
+    return variants
+
+
+def flatten(image):
+    """JPEG has no alpha channel: paint transparent areas white"""
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def write_atomic(image, path, pil_format, quality):
+    # readers never see a half-written file, even while a variant is redone
+    temporary = f"{path}.{os.getpid()}.tmp"
+    image.save(temporary, pil_format, quality=quality)
+    os.replace(temporary, path)
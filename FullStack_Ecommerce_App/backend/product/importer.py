@@ -0,0 +1,193 @@
+import csv
+import io
+import json
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from .cache import invalidate_catalog
+from .facets import rebuild_facet_counts
+from .models import Product
+from .suggest import suggest_index
+
+IMPORT_FORMATS = ("csv", "jsonl")
+UPDATE_FIELDS = ["name", "description", "price", "quantity", "stock"]
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=64)
+    name = serializers.CharField(max_length=200)
+    # optional columns carry no default: a new product gets the model's, an
+    # existing one keeps what it has
+    description = serializers.CharField(allow_blank=True, required=False)
+    price = serializers.DecimalField(max_digits=8, decimal_places=2)
+    # units on hand; `stock` follows them, as in product.inventory
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if "quantity" in attrs:
+            attrs["stock"] = attrs["quantity"] > 0
+        return attrs
+
+
+def guess_format(filename):
+    extension = filename.rsplit(".", 1)[-1].lower()
+    return extension if extension in IMPORT_FORMATS else None
+
+
+def iter_rows(binary_file, fmt):
+    """Yield (line number, row dict or parse error) without reading the whole file"""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    # an undecodable or malformed file ends the import with an error on the
+    # first line that could not be read; the batches before it are kept
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except UnicodeDecodeError as e:
+            yield reader.line_num + 1, f"Not UTF-8, import stopped: {e}"
+        except csv.Error as e:
+            yield reader.line_num + 1, f"Invalid CSV, import stopped: {e}"
+        return
+
+    line_number = 0
+    try:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_number, "Each line must be a JSON object."
+                continue
+            yield line_number, row
+    except UnicodeDecodeError as e:
+        yield line_number + 1, f"Not UTF-8, import stopped: {e}"
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_products(rows, batch_size=1000):
+    """Upsert products by SKU from (line number, row) pairs, one transaction per batch.
+
+    Invalid rows are skipped and reported; valid rows of the same batch are
+    still written. Returns a summary with the per-row errors and throughput.
+    """
+    started = time.perf_counter()
+    report = {"rows": 0, "created": 0, "updated": 0, "error_count": 0, "errors": []}
+
+    # one serializer instance validates every row; building a new one per row
+    # costs more than the validation itself
+    validator = ProductImportRowSerializer()
+
+    for chunk in chunked(rows, batch_size):
+        valid = {}
+        for line_number, row in chunk:
+            report["rows"] += 1
+            if not isinstance(row, dict):
+                add_error(report, line_number, row)
+                continue
+            try:
+                data = validator.run_validation(row)
+            except serializers.ValidationError as e:
+                add_error(report, line_number, e.detail)
+                continue
+            # a SKU repeated within the batch: the last row wins
+            valid[data["sku"]] = data
+
+        created, updated = write_batch(valid)
+        report["created"] += created
+        report["updated"] += updated
+
+    finish_import()
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed) if elapsed else None
+    return report
+
+
+def add_error(report, line_number, errors):
+    report["error_count"] += 1
+    if len(report["errors"]) < settings.IMPORT_MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line_number, "errors": errors})
+
+
+def write_batch(rows_by_sku):
+    if not rows_by_sku:
+        return 0, 0
+
+    with transaction.atomic():
+        skus = list(rows_by_sku)
+        existing = dict(Product.objects.filter(sku__in=skus).values_list("sku", "id"))
+        Product.objects.bulk_create(
+            Product(**data)
+            for sku, data in rows_by_sku.items()
+            if sku not in existing
+        )
+        update_products(
+            {product_id: rows_by_sku[sku] for sku, product_id in existing.items()}
+        )
+
+    invalidate_catalog(existing.values())
+    return len(rows_by_sku) - len(existing), len(existing)
+
+
+def update_products(rows_by_id):
+    """Write the UPDATE_FIELDS present in each row, one executemany per field set.
+
+    A row only overwrites the columns it contains, so a partial feed (say SKU
+    and price) leaves the rest of the product alone. bulk_update() builds a
+    CASE expression per field and row, which costs far more than the UPDATE
+    statements themselves.
+    """
+    rows_by_fields = defaultdict(dict)
+    for product_id, data in rows_by_id.items():
+        names = tuple(name for name in UPDATE_FIELDS if name in data)
+        rows_by_fields[names][product_id] = data
+    for names, rows in rows_by_fields.items():
+        update_fields(names, rows)
+
+
+def update_fields(names, rows_by_id):
+    fields = [Product._meta.get_field(name) for name in names]
+    assignments = ", ".join(
+        "%s = %%s" % connection.ops.quote_name(field.column) for field in fields
+    )
+    # an import is an edit like any other (see product.editing)
+    sql = (
+        f"UPDATE {Product._meta.db_table} SET {assignments}, version = version + 1 "
+        "WHERE id = %s"
+    )
+
+    params = []
+    for product_id, data in rows_by_id.items():
+        values = [
+            field.get_db_prep_save(data[field.name], connection) for field in fields
+        ]
+        params.append(values + [product_id])
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def finish_import():
+    # bulk writes send no model signals, so refresh the derived data in one go
+    # (the full-text index is kept in sync by its database triggers)
+    rebuild_facet_counts()
+    suggest_index.invalidate()
+    invalidate_catalog()
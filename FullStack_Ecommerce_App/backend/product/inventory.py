@@ -0,0 +1,157 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import invalidate_catalog
+from .models import Product, StockReservation, move_facet_cell, stored_facet_cell
+
+
+class OutOfStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Not enough stock."
+    default_code = "out_of_stock"
+
+
+class ReservationExpired(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Reservation has expired."
+    default_code = "reservation_expired"
+
+
+# Stock changes are conditional UPDATEs evaluated by the database, so two
+# buyers can never both take the last unit. Each change is tried first as
+# an update that leaves `stock` as it is and then as one that flips it; the
+# row conditions tell which of the two applied, so the facet counts and
+# cached catalog pages are only touched when availability really changed.
+
+
+def take_stock(product_id, quantity):
+    """Remove units if at least that many are left; returns whether it did"""
+    products = Product.objects.filter(pk=product_id, quantity__gte=quantity)
+    for _ in range(settings.STOCK_UPDATE_RETRIES):
+        # in stock before and after, or already flagged out of stock
+        kept = products.filter(
+            Q(quantity__gt=quantity, stock=True) | Q(quantity=quantity, stock=False)
+        ).update(quantity=F("quantity") - quantity)
+        if kept:
+            return True
+        flipped = products.filter(
+            Q(quantity__gt=quantity, stock=False) | Q(quantity=quantity, stock=True)
+        ).update(
+            quantity=F("quantity") - quantity,
+            stock=Case(
+                When(quantity__gt=quantity, then=Value(True)), default=Value(False)
+            ),
+        )
+        if flipped:
+            stock_flipped(product_id)
+            return True
+        if not products.exists():
+            return False
+    return False
+
+
+def put_back_stock(product_id, quantity):
+    """Return units to stock"""
+    products = Product.objects.filter(pk=product_id)
+    for _ in range(settings.STOCK_UPDATE_RETRIES):
+        if products.filter(stock=True).update(quantity=F("quantity") + quantity):
+            return
+        if products.filter(stock=False).update(
+            quantity=F("quantity") + quantity, stock=True
+        ):
+            stock_flipped(product_id)
+            return
+
+
+def set_quantity(product_id, quantity):
+    """Overwrite the units on hand, e.g. after a stock take"""
+    with transaction.atomic():
+        old_cell = stored_facet_cell(product_id, lock=True)
+        Product.objects.filter(pk=product_id).update(
+            quantity=quantity, stock=quantity > 0
+        )
+        if old_cell is not None and old_cell[2] != (quantity > 0):
+            stock_flipped(product_id)
+
+
+def stock_flipped(product_id):
+    # queryset updates send no signals: move the facet cell and drop the
+    # cached catalog pages by hand
+    new_cell = stored_facet_cell(product_id)
+    move_facet_cell((new_cell[0], new_cell[1], not new_cell[2]), new_cell)
+    invalidate_catalog([product_id])
+
+
+def reserve_stock(product_id, quantity, user=None):
+    """Hold units for a checkout until STOCK_RESERVATION_TTL runs out.
+
+    Raises OutOfStock when not enough units are left, after handing back any
+    expired reservations of the product.
+    """
+    with transaction.atomic():
+        if not take_stock(product_id, quantity):
+            if not release_expired_reservations(product_id) or not take_stock(
+                product_id, quantity
+            ):
+                raise OutOfStock()
+        expires_at = timezone.now() + datetime.timedelta(
+            seconds=settings.STOCK_RESERVATION_TTL
+        )
+        return StockReservation.objects.create(
+            product_id=product_id, user=user, quantity=quantity, expires_at=expires_at
+        )
+
+
+# A reservation ends by being deleted, and the DELETE that removes it is
+# what decides the outcome: whoever deletes the row (checkout, cancel or the
+# expiry sweep) is the only one acting on it.
+
+
+def confirm_reservation(reservation):
+    """Keep the reserved units for good once the order is paid"""
+    deleted, _ = StockReservation.objects.filter(
+        pk=reservation.pk, expires_at__gt=timezone.now()
+    ).delete()
+    if not deleted:
+        raise ReservationExpired()
+
+
+def release_reservation(reservation):
+    """Hand the units of an unpaid reservation back to stock"""
+    with transaction.atomic():
+        deleted, _ = StockReservation.objects.filter(pk=reservation.pk).delete()
+        if deleted:
+            put_back_stock(reservation.product_id, reservation.quantity)
+    return bool(deleted)
+
+
+def release_expired_reservations(product_id=None):
+    """Hand back every expired reservation; returns the number released"""
+    now = timezone.now()
+    expired = StockReservation.objects.filter(expires_at__lte=now)
+    if product_id is not None:
+        expired = expired.filter(product_id=product_id)
+
+    released = 0
+    for reservation_id, held_product_id, quantity in list(
+        expired.values_list("id", "product_id", "quantity")
+    ):
+        with transaction.atomic():
+            if expired.filter(pk=reservation_id).delete()[0]:
+                put_back_stock(held_product_id, quantity)
+                released += 1
+    return released
+
+
+def reserved_quantity(product_id):
+    """Units held by reservations that have not expired yet"""
+    held = StockReservation.objects.filter(
+        product_id=product_id, expires_at__gt=timezone.now()
+    ).aggregate(total=Sum("quantity"))["total"]
+    return held or 0
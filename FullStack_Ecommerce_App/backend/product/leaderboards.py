@@ -0,0 +1,113 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .cache import invalidate_catalog
+from .importer import chunked
+from .models import Product, ProductScore
+
+# board name -> ordering over ProductScore, both served by an index
+BOARDS = {
+    "top_rated": ("-top_rated", "-product_id"),
+    "trending": ("-trending", "-top_rated", "-product_id"),
+}
+
+
+def top_rated_score(rating_sum, total_ratings):
+    """Average rating pulled towards a prior, so one 5-star review ranks low"""
+    weight = settings.TOP_RATED_PRIOR_RATINGS
+    return (rating_sum + settings.TOP_RATED_PRIOR_MEAN * weight) / (
+        total_ratings + weight
+    )
+
+
+def refresh_scores(product_ids):
+    """Recompute the leaderboard scores of the given products.
+
+    One grouped query over the products' own ratings (served by the
+    (product, created_at) index) and one upsert, so the cost follows the
+    number of changed products rather than the catalog size.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+
+    now = timezone.now()
+    window = datetime.timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    recent = Q(ratings__created_at__gt=now - window)
+    rows = (
+        Product.objects.filter(pk__in=product_ids, total_ratings__gt=0)
+        .annotate(
+            recent_ratings=Count("ratings", filter=recent),
+            oldest_recent=Min("ratings__created_at", filter=recent),
+        )
+        .values_list(
+            "id", "rating_sum", "total_ratings", "recent_ratings", "oldest_recent"
+        )
+    )
+    scores = []
+    for product_id, rating_sum, total_ratings, recent_ratings, oldest_recent in rows:
+        scores.append(
+            ProductScore(
+                product_id=product_id,
+                top_rated=top_rated_score(rating_sum, total_ratings),
+                trending=recent_ratings,
+                # the trending score drops when the oldest recent rating ages out
+                trending_expires_at=(
+                    None if oldest_recent is None else oldest_recent + window
+                ),
+            )
+        )
+
+    with transaction.atomic():
+        # products that lost their last rating leave the boards
+        rated = {score.product_id for score in scores}
+        ProductScore.objects.filter(pk__in=set(product_ids) - rated).delete()
+        ProductScore.objects.bulk_create(
+            scores,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["top_rated", "trending", "trending_expires_at"],
+        )
+    invalidate_catalog()
+    return len(product_ids)
+
+
+def refresh_expired(batch_size=1000):
+    """Refresh products whose trending score changed because ratings aged out"""
+    refreshed = 0
+    while True:
+        expired = list(
+            ProductScore.objects.filter(trending_expires_at__lte=timezone.now())
+            .order_by("trending_expires_at")
+            .values_list("product_id", flat=True)[:batch_size]
+        )
+        if not expired:
+            return refreshed
+        refreshed += refresh_scores(expired)
+
+
+def refresh_all(batch_size=1000):
+    """Recompute every rated product, e.g. after changing the scoring settings"""
+    refreshed = 0
+    product_ids = (
+        Product.objects.filter(total_ratings__gt=0)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+    for batch in chunked(product_ids, batch_size):
+        refreshed += refresh_scores(batch)
+    ProductScore.objects.filter(product__total_ratings=0).delete()
+    return refreshed
+
+
+def leaderboard(board, limit):
+    """The first `limit` products of a board, with their scores"""
+    scores = ProductScore.objects.order_by(*BOARDS[board])
+    if board == "trending":
+        scores = scores.filter(trending__gt=0)
+    return scores.select_related("product")[:limit]
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from product.inventory import OutOfStock, reserve_stock
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Reserve units of one hot product from many threads at once and check "
+        "that no more units are sold than there were in stock"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--stock", type=int, default=1000)
+        parser.add_argument(
+            "--attempts",
+            type=int,
+            default=100,
+            help="Reservations of one unit each thread tries.",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["threads"], options["stock"], options["attempts"]) < 1:
+            raise CommandError("--threads, --stock and --attempts must be positive.")
+
+        product = Product.objects.create(
+            name="Inventory benchmark", price=1, quantity=options["stock"], stock=True
+        )
+        results = {"reserved": 0, "out_of_stock": 0, "errors": 0}
+        lock = threading.Lock()
+        start = threading.Barrier(options["threads"])
+
+        def buyer():
+            counts = dict.fromkeys(results, 0)
+            start.wait()
+            try:
+                for _ in range(options["attempts"]):
+                    try:
+                        reserve_stock(product.id, 1)
+                        counts["reserved"] += 1
+                    except OutOfStock:
+                        counts["out_of_stock"] += 1
+                    except OperationalError:
+                        counts["errors"] += 1
+            finally:
+                connection.close()
+                with lock:
+                    for key, value in counts.items():
+                        results[key] += value
+
+        threads = [threading.Thread(target=buyer) for _ in range(options["threads"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        attempts = options["threads"] * options["attempts"]
+        oversold = results["reserved"] - options["stock"]
+        sold = options["stock"] - product.quantity
+        self.stdout.write(
+            f"{attempts} attempts from {options['threads']} threads in "
+            f"{elapsed:.2f}s ({attempts / elapsed:.0f}/s): "
+            f"{results['reserved']} reserved, {results['out_of_stock']} out of "
+            f"stock, {results['errors']} database errors; "
+            f"{product.quantity} units left, in stock: {product.stock}"
+        )
+        product.delete()
+
+        if oversold > 0 or sold != results["reserved"]:
+            raise CommandError(
+                f"Stock mismatch: {results['reserved']} reserved, {sold} sold."
+            )
+        self.stdout.write(self.style.SUCCESS("No overselling."))
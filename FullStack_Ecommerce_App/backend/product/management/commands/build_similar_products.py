@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from product.recommendations import build_similar_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the \"customers also bought\" lists from the order history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top-k", type=int, default=settings.SIMILAR_PRODUCTS_TOP_K
+        )
+        parser.add_argument(
+            "--min-support", type=int, default=settings.SIMILAR_PRODUCTS_MIN_SUPPORT
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=1,
+            help="Passes over the orders; memory use shrinks with each one added.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if min(options["top_k"], options["shards"], options["chunk_size"]) < 1:
+            raise CommandError("--top-k, --shards and --chunk-size must be positive.")
+
+        started = time.perf_counter()
+        written = build_similar_products(
+            options["top_k"],
+            options["min_support"],
+            shards=options["shards"],
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {written} similar products "
+                f"in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,46 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from product.images import delete_variants
+from product.models import StoredBlob
+from product.storage import blob_storage
+
+
+class Command(BaseCommand):
+    help = "Delete stored files that no product or report has used for a while"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-seconds",
+            type=int,
+            default=settings.BLOB_GC_GRACE_SECONDS,
+            help="Keep unreferenced blobs last used more recently than this.",
+        )
+
+    def handle(self, *args, **options):
+        if options["grace_seconds"] < 0:
+            raise CommandError("--grace-seconds cannot be negative.")
+        cutoff = timezone.now() - datetime.timedelta(seconds=options["grace_seconds"])
+        unused = StoredBlob.objects.filter(ref_count__lte=0, last_used__lt=cutoff)
+
+        deleted = freed = 0
+        blobs = list(unused.values_list("id", "name", "digest", "size"))
+        for blob_id, name, digest, size in blobs:
+            # the row goes first and only if still unused: an upload of the
+            # same content in the meantime refreshed last_used
+            if not unused.filter(pk=blob_id).delete()[0]:
+                continue
+            blob_storage.delete(name)
+            # variants are named by digest, which a copy with another
+            # extension shares
+            if not StoredBlob.objects.filter(digest=digest).exists():
+                delete_variants(name)
+            deleted += 1
+            freed += size
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} unused blobs, freed {freed} bytes.")
+        )
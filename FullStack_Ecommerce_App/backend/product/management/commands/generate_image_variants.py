@@ -0,0 +1,102 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from product.images import save_variants, variant_job
+from product.imaging import render_variants
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = "Render thumbnail and WebP variants for product images, in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render products that already have variants.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.IMAGE_VARIANT_WORKERS,
+            help="Worker processes; 0 renders in this process.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers < 0:
+            raise CommandError("--workers cannot be negative.")
+
+        products = Product.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            products = products.filter(image_variants={})
+
+        pool = None
+        if workers:
+            # spawned like the web workers' pool (see product.images)
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        rendered = failed = 0
+        try:
+            # a bounded number of jobs in flight keeps memory flat
+            for batch in self.batches(products, max(workers, 1) * 4):
+                for product_id, image_name, files in self.render(batch, pool):
+                    if isinstance(files, Exception):
+                        failed += 1
+                        self.stderr.write(f"product {product_id} {image_name}: {files}")
+                        continue
+                    save_variants(product_id, image_name, files)
+                    rendered += 1
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered variants for {rendered} products, {failed} failed."
+            )
+        )
+
+    def batches(self, products, size):
+        # keyset pages rather than one open cursor: the loop writes to the
+        # rows being read, which SQLite does not isolate within a connection
+        last_id = 0
+        while True:
+            batch = list(
+                products.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "image")[:size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1][0]
+
+    def render(self, batch, pool):
+        """Yield (product id, image name, variant files or the error raised)"""
+        if pool is None:
+            for product_id, image_name in batch:
+                try:
+                    files = render_variants(*variant_job(image_name))
+                except Exception as e:
+                    files = e
+                yield product_id, image_name, files
+            return
+
+        futures = {
+            pool.submit(render_variants, *variant_job(image_name)): (
+                product_id,
+                image_name,
+            )
+            for product_id, image_name in batch
+        }
+        for future in as_completed(futures):
+            try:
+                files = future.result()
+            except Exception as e:
+                files = e
+            yield *futures[future], files
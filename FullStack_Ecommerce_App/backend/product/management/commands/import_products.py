@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from product.importer import IMPORT_FORMATS, guess_format, import_products, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSONL product feed into the catalog, upserting by SKU"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file to import.")
+        parser.add_argument("--format", choices=IMPORT_FORMATS)
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        if fmt is None:
+            raise CommandError("Cannot tell the file format, pass --format.")
+
+        with open(options["path"], "rb") as feed:
+            report = import_products(iter_rows(feed, fmt), options["batch_size"])
+
+        for error in report["errors"]:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{report['rows']} rows: {report['created']} created, "
+                f"{report['updated']} updated, {report['error_count']} rejected "
+                f"({report['rows_per_second']} rows/s)."
+            )
+        )
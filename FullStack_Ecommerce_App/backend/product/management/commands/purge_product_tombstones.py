@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from product.changes import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete tombstones of products deleted more than --days ago; clients "
+        "that have not synced since then download the catalog again"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.PRODUCT_TOMBSTONE_RETENTION_DAYS
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days cannot be negative.")
+        purged = purge_tombstones(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} tombstones."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from product.facets import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the precomputed product facet summary from the product table"
+
+    def handle(self, *args, **options):
+        rebuild_facet_counts()
+        self.stdout.write(self.style.SUCCESS("Rebuilt product facet counts."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from product.clustering import rebuild_clusters
+
+
+class Command(BaseCommand):
+    help = (
+        "Cluster every report again, e.g. after importing reports in bulk or "
+        "changing the REPORT_MINHASH_* settings"
+    )
+
+    def handle(self, *args, **options):
+        clusters = rebuild_clusters()
+        self.stdout.write(self.style.SUCCESS(f"Built {clusters} report clusters."))
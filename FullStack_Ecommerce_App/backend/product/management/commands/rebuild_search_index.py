@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from product.search import has_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text product search index from the product table"
+
+    def handle(self, *args, **options):
+        if not has_search_index():
+            raise CommandError("The full-text search index needs SQLite.")
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            rebuild_search_index()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt product search index in {elapsed:.2f}s.")
+        )
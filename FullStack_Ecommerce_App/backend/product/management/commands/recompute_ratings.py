@@ -0,0 +1,93 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Round
+
+from product.cache import invalidate_catalog
+from product.facets import rebuild_facet_counts
+from product.leaderboards import refresh_scores
+from product.models import Product, Rating
+
+STARS = range(1, 6)
+AGGREGATE_FIELDS = ["rating_sum", "total_ratings", "average_rating"] + [
+    f"rating_count_{star}" for star in STARS
+]
+
+
+class Command(BaseCommand):
+    help = "Recompute rating aggregates and histograms for every product from its ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of products written per UPDATE batch.",
+        )
+
+    def handle(self, *args, **options):
+        # one grouped query gives the per-star counts of every rated product
+        histograms = defaultdict(lambda: dict.fromkeys(STARS, 0))
+        for row in Rating.objects.values("product", "rating").annotate(n=Count("id")):
+            histograms[row["product"]][row["rating"]] = row["n"]
+
+        # averages stored unrounded read back rounded, so the comparison
+        # below cannot see them; round them in place
+        rounded = Product.objects.exclude(
+            average_rating=Round(F("average_rating"), 2)
+        ).update(average_rating=Round(F("average_rating"), 2))
+
+        drifted = []
+        products = Product.objects.only("id", *AGGREGATE_FIELDS)
+        for product in products.iterator(chunk_size=options["batch_size"]):
+            if self.reconcile(product, histograms[product.id]):
+                drifted.append(product)
+
+        with transaction.atomic():
+            Product.objects.bulk_update(
+                drifted, AGGREGATE_FIELDS, batch_size=options["batch_size"]
+            )
+            if drifted or rounded:
+                # repaired averages may land in other rating buckets
+                rebuild_facet_counts()
+            if drifted:
+                refresh_scores(product.id for product in drifted)
+
+        if drifted or rounded:
+            # bulk writes send no signals; the rounded averages are not known
+            # by id, bumping the catalog version covers their listings
+            invalidate_catalog(
+                [product.id for product in drifted], refresh_suggestions=True
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired rating aggregates of {len(drifted)} product(s).")
+        )
+
+    def reconcile(self, product, histogram):
+        """Set the true aggregates on `product`, returning whether anything changed"""
+        total = sum(histogram.values())
+        rating_sum = sum(star * n for star, n in histogram.items())
+        expected = {
+            "rating_sum": rating_sum,
+            "total_ratings": total,
+            "average_rating": (
+                # half up, like SQL ROUND() in apply_rating_delta
+                (Decimal(rating_sum) / total).quantize(
+                    Decimal("0.01"), rounding=ROUND_HALF_UP
+                )
+                if total
+                else Decimal("0.00")
+            ),
+        }
+        expected.update({f"rating_count_{star}": histogram[star] for star in STARS})
+
+        changed = False
+        for field, value in expected.items():
+            if getattr(product, field) != value:
+                setattr(product, field, value)
+                changed = True
+        return changed
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from product.leaderboards import refresh_all, refresh_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh leaderboard scores of products whose trending ratings aged out; "
+        "run it on a schedule, or with --all to recompute every product"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Recompute every rated product."
+        )
+
+    def handle(self, *args, **options):
+        refreshed = refresh_all() if options["all"] else refresh_expired()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} products."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from product.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Hand the units of expired, unpaid stock reservations back to stock"
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} reservations."))
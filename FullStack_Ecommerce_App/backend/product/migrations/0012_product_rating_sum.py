@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:29
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model("product", "Product")
+    Rating = apps.get_model("product", "Rating")
+
+    totals = Rating.objects.values("product").annotate(
+        rating_count=Count("id"), rating_total=Sum("rating")
+    )
+    for row in totals:
+        Product.objects.filter(pk=row["product"]).update(
+            rating_sum=row["rating_total"],
+            total_ratings=row["rating_count"],
+            average_rating=round(row["rating_total"] / row["rating_count"], 2),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0011_product_average_rating_product_total_ratings_report_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
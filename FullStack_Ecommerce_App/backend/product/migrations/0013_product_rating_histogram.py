@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_histogram(apps, schema_editor):
+    Product = apps.get_model("product", "Product")
+    Rating = apps.get_model("product", "Rating")
+
+    counts = Rating.objects.values("product", "rating").annotate(n=Count("id"))
+    for row in counts:
+        Product.objects.filter(pk=row["product"]).update(
+            **{f"rating_count_{row['rating']}": row["n"]}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0012_product_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0013_product_rating_histogram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['product', 'created_at'], name='rating_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['product', 'rating'], name='rating_product_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:36
+
+from django.db import migrations
+
+# Full-text index over Product.name/description. It is an external-content
+# FTS5 table, so it stores only the index; triggers keep it in step with every
+# write to product_product, bulk_create and queryset.update() included.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+        name, description,
+        content='product_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product_product
+    BEGIN
+        INSERT INTO product_search(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product_product
+    BEGIN
+        INSERT INTO product_search(product_search, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_au
+    AFTER UPDATE OF name, description ON product_product
+    BEGIN
+        INSERT INTO product_search(product_search, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_search(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS product_search_ai",
+    "DROP TRIGGER IF EXISTS product_search_ad",
+    "DROP TRIGGER IF EXISTS product_search_au",
+    "DROP TABLE IF EXISTS product_search",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; other databases fall back to LIKE in product.search
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+    schema_editor.execute(
+        "INSERT INTO product_search(product_search) VALUES ('rebuild')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0014_rating_product_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
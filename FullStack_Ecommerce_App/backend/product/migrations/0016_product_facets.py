@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:40
+
+import bisect
+import math
+from collections import Counter
+
+from django.db import migrations, models
+
+PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+
+
+def backfill_facet_counts(apps, schema_editor):
+    Product = apps.get_model("product", "Product")
+    ProductFacetCount = apps.get_model("product", "ProductFacetCount")
+
+    cells = Counter()
+    rows = Product.objects.values_list("price", "stock", "average_rating")
+    for price, stock, average_rating in rows.iterator():
+        price_bucket = max(0, bisect.bisect_right(PRICE_BUCKETS, price) - 1)
+        rating_bucket = min(5, max(0, math.floor(average_rating)))
+        cells[price_bucket, rating_bucket, bool(stock)] += 1
+
+    ProductFacetCount.objects.bulk_create(
+        ProductFacetCount(
+            price_bucket=price_bucket,
+            rating_bucket=rating_bucket,
+            in_stock=in_stock,
+            count=count,
+        )
+        for (price_bucket, rating_bucket, in_stock), count in cells.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0015_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('rating_bucket', models.PositiveSmallIntegerField()),
+                ('in_stock', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock'], name='product_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['average_rating'], name='product_avg_rating_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productfacetcount',
+            unique_together={('price_bucket', 'rating_bucket', 'in_stock')},
+        ),
+        migrations.RunPython(backfill_facet_counts, migrations.RunPython.noop),
+    ]
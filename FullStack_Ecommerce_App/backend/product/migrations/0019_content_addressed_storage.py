@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+import django.utils.timezone
+import product.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0018_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=product.storage.ContentAddressedStorage(), upload_to=''),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='evidence',
+            field=models.FileField(blank=True, null=True, storage=product.storage.ContentAddressedStorage(), upload_to='report_evidence/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('last_used', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_used'], name='blob_unused_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0020_product_quantity_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductViewCount',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_count', serialize=False, to='product.product')),
+                ('views', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
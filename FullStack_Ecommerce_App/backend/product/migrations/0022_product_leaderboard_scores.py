@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0021_product_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductScore',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='product.product')),
+                ('top_rated', models.FloatField(default=0)),
+                ('trending', models.IntegerField(default=0)),
+                ('trending_expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['top_rated'], name='score_top_rated_idx'), models.Index(fields=['trending', 'top_rated'], name='score_trending_idx'), models.Index(fields=['trending_expires_at'], name='score_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+# Every write to product_product takes the next value of the change counter,
+# and every delete leaves a tombstone under one. Triggers cover bulk_create,
+# queryset.update() and cascades the same as Model.save()/delete(); SQLite
+# runs one writer at a time, so values are handed out in commit order.
+NEXT_SEQ = """
+    INSERT INTO product_productchangesequence (id, value, purged_through)
+    VALUES (1, 1, 0)
+    ON CONFLICT (id) DO UPDATE SET value = value + 1;
+"""
+CURRENT_SEQ = "(SELECT value FROM product_productchangesequence WHERE id = 1)"
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# the columns ProductSerializer shows; stock counts alone are not a change
+SYNCED_COLUMNS = (
+    "sku, name, description, price, stock, image, image_variants, "
+    "average_rating, total_ratings, rating_count_1, rating_count_2, "
+    "rating_count_3, rating_count_4, rating_count_5"
+)
+
+CREATE_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_changes_ai AFTER INSERT ON product_product
+    BEGIN
+        {NEXT_SEQ}
+        UPDATE product_product SET change_seq = {CURRENT_SEQ} WHERE id = new.id;
+        DELETE FROM product_producttombstone WHERE product_id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_changes_au
+    AFTER UPDATE OF {SYNCED_COLUMNS} ON product_product
+    BEGIN
+        {NEXT_SEQ}
+        UPDATE product_product
+        SET change_seq = {CURRENT_SEQ},
+            updated_at = CASE WHEN new.updated_at IS old.updated_at
+                THEN {NOW} ELSE new.updated_at END
+        WHERE id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_changes_ad AFTER DELETE ON product_product
+    BEGIN
+        {NEXT_SEQ}
+        INSERT OR REPLACE INTO product_producttombstone
+            (product_id, change_seq, deleted_at)
+        VALUES (old.id, {CURRENT_SEQ}, {NOW});
+    END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS product_changes_ai",
+    "DROP TRIGGER IF EXISTS product_changes_au",
+    "DROP TRIGGER IF EXISTS product_changes_ad",
+]
+
+
+def create_change_feed(apps, schema_editor):
+    Product = apps.get_model("product", "Product")
+    ProductChangeSequence = apps.get_model("product", "ProductChangeSequence")
+    # existing products enter the feed in the order they were created
+    Product.objects.update(change_seq=F("id"))
+    last_id = Product.objects.aggregate(last=Max("id"))["last"] or 0
+    ProductChangeSequence.objects.create(pk=1, value=last_id)
+    # triggers are SQLite only, like the search index
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement, params=None)
+
+
+def drop_change_feed(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0023_similar_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+                ('purged_through', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductTombstone',
+            fields=[
+                ('product_id', models.PositiveBigIntegerField(primary_key=True, serialize=False)),
+                ('change_seq', models.PositiveBigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(create_change_feed, drop_change_feed),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0024_product_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['status', 'created_at'], name='report_status_created_idx'),
+        ),
+    ]
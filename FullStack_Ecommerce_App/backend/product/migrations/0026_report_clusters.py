@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0025_report_status_created_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('signature', models.JSONField()),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='report_clusters', to='product.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReportBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField()),
+                ('product', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product.product')),
+                ('cluster', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='product.reportcluster')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='cluster',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reports', to='product.reportcluster'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['cluster', 'status'], name='report_cluster_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportbucket',
+            index=models.Index(fields=['product', 'bucket'], name='report_bucket_lookup_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0026_report_clusters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
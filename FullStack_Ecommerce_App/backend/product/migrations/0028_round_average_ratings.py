@@ -0,0 +1,49 @@
+import bisect
+import math
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Round
+
+PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+
+
+def round_average_ratings(apps, schema_editor):
+    """Round averages stored with more than two places by apply_rating_delta"""
+    Product = apps.get_model("product", "Product")
+    ProductFacetCount = apps.get_model("product", "ProductFacetCount")
+
+    unrounded = Product.objects.exclude(average_rating=Round(F("average_rating"), 2))
+    if not unrounded.update(average_rating=Round(F("average_rating"), 2)):
+        return
+
+    # rounding up may have moved products to the next rating bucket
+    cells = Counter()
+    rows = Product.objects.values_list("price", "stock", "average_rating")
+    for price, stock, average_rating in rows.iterator():
+        price_bucket = max(0, bisect.bisect_right(PRICE_BUCKETS, price) - 1)
+        rating_bucket = min(5, max(0, math.floor(average_rating)))
+        cells[price_bucket, rating_bucket, bool(stock)] += 1
+
+    ProductFacetCount.objects.all().delete()
+    ProductFacetCount.objects.bulk_create(
+        ProductFacetCount(
+            price_bucket=price_bucket,
+            rating_bucket=rating_bucket,
+            in_stock=in_stock,
+            count=count,
+        )
+        for (price_bucket, rating_bucket, in_stock), count in cells.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0027_product_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(round_average_ratings, migrations.RunPython.noop),
+    ]
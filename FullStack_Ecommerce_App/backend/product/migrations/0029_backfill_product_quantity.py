@@ -0,0 +1,22 @@
+from django.db import migrations
+
+# "in stock" had no count before 0020 added quantity; products listed as in
+# stock get this many units so they stay orderable until a stock take sets
+# the real number (PUT /api/product/<id>/inventory/)
+BACKFILL_QUANTITY = 1000
+
+
+def backfill_quantity(apps, schema_editor):
+    Product = apps.get_model("product", "Product")
+    Product.objects.filter(stock=True, quantity=0).update(quantity=BACKFILL_QUANTITY)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0028_round_average_ratings'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_quantity, migrations.RunPython.noop),
+    ]
@@ -1,22 +1,89 @@
-from django.db import models
+import bisect
+import math
+
+from django.db import models, transaction
+from django.db.models import DecimalField, F, FloatField
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .storage import blob_storage
 
 User = get_user_model()
 
 
+class ProductQuerySet(models.QuerySet):
+
+    def with_ratings(self):
+        """Prefetch ratings and their users so serializing them costs no extra queries"""
+        return self.prefetch_related(
+            models.Prefetch("ratings", queryset=Rating.objects.select_related("user"))
+        )
+
+
 class Product(models.Model):
+    # supplier / external id, the key bulk imports upsert on
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200, blank=False, null=False)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=8, decimal_places=2)
     stock = models.BooleanField(default=False)
-    image = models.ImageField(null=True, blank=True)
+    # units on hand and not reserved; `stock` follows it when it reaches or
+    # leaves zero (see product/inventory.py)
+    quantity = models.PositiveIntegerField(default=0)
+    image = models.ImageField(null=True, blank=True, storage=blob_storage)
+    # resized JPEG/WebP copies of `image`, {size name: {format: storage name}}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
     total_ratings = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    # per-star review counts, kept in sync by the rating write path
+    rating_count_1 = models.IntegerField(default=0)
+    rating_count_2 = models.IntegerField(default=0)
+    rating_count_3 = models.IntegerField(default=0)
+    rating_count_4 = models.IntegerField(default=0)
+    rating_count_5 = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # position of the product's last change in the catalog change feed; set
+    # by database triggers on every write, bulk and queryset writes included
+    # (see product.changes)
+    change_seq = models.PositiveBigIntegerField(
+        default=0, editable=False, db_index=True
+    )
+    # optimistic concurrency for edits: every edit writes version + 1, and an
+    # edit based on an older version is refused (see product.editing)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["price"], name="product_price_idx"),
+            models.Index(fields=["stock"], name="product_stock_idx"),
+            models.Index(fields=["average_rating"], name="product_avg_rating_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # a full save is an edit; update_fields saves only write derived data
+        bump = not self._state.adding and kwargs.get("update_fields") is None
+        if bump:
+            # counted in the database, a stale instance cannot reuse a version
+            self.version = F("version") + 1
+        super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=["version"])
+
+    def facet_cell(self):
+        return facet_cell(self.price, self.stock, self.average_rating)
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f"rating_count_{star}") for star in range(5, 0, -1)}
+
 
 class Rating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -31,18 +98,303 @@ class Rating(models.Model):
 
     class Meta:
         unique_together = ("user", "product")  # One rating per user per product
+        indexes = [
+            # back the newest / highest / lowest orderings of a product's ratings
+            models.Index(
+                fields=["product", "created_at"], name="rating_product_created_idx"
+            ),
+            models.Index(
+                fields=["product", "rating"], name="rating_product_rating_idx"
+            ),
+        ]
 
-    def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what is already counted in the product aggregates
+        instance._counted = (
+            instance.__dict__.get("product_id"),
+            instance.__dict__.get("rating"),
+        )
+        return instance
+
+    def save(self, *args, apply_delta=None, **kwargs):
+        """Save and shift the product aggregates by the change in stars.
+
+        `apply_delta` replaces apply_rating_delta, e.g. to queue the change
+        for a batched write (see product.ratings).
+        """
+        counted = getattr(self, "_counted", (None, None))
+        self._aggregates_deferred = apply_delta is not None
+        apply_delta = apply_delta or apply_rating_delta
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            if counted == (self.product_id, self.rating):
+                return
+            if counted[0] == self.product_id:
+                apply_delta(
+                    self.product_id, rating_delta(added=self.rating, removed=counted[1])
+                )
+            else:
+                if counted[0] is not None:
+                    apply_delta(counted[0], rating_delta(removed=counted[1]))
+                apply_delta(self.product_id, rating_delta(added=self.rating))
+
+        self._counted = (self.product_id, self.rating)
+
+
+def rating_delta(added=None, removed=None):
+    """Column deltas on Product for adding and/or removing one star rating"""
+    delta = {"rating_sum": 0, "total_ratings": 0}
+    for stars, sign in ((added, 1), (removed, -1)):
+        if stars is None:
+            continue
+        delta["rating_sum"] += sign * stars
+        delta["total_ratings"] += sign
+        column = f"rating_count_{stars}"
+        delta[column] = delta.get(column, 0) + sign
+    return delta
+
+
+def apply_rating_delta(product_id, delta):
+    """Shift a product's rating aggregates by `delta` in a single UPDATE.
+
+    Everything is computed from the row's current values inside the database,
+    so concurrent writers never overwrite each other's counts.
+    """
+    updates = {column: F(column) + value for column, value in delta.items()}
+    new_sum, new_count = updates["rating_sum"], updates["total_ratings"]
+    # rounded like the column, or keyset cursors built from the read-back
+    # value would not match the stored one
+    new_average = Coalesce(
+        Round(
+            Cast(new_sum, FloatField()) / Cast(NullIf(new_count, 0), FloatField()),
+            2,
+            output_field=DecimalField(max_digits=3, decimal_places=2),
+        ),
+        0.0,
+    )
+    with transaction.atomic():
+        before = stored_facet_cell(product_id, lock=True)
+        Product.objects.filter(pk=product_id).update(
+            average_rating=new_average, **updates
+        )
+        # the new average may have moved the product to another rating bucket
+        if before is not None:
+            move_facet_cell(before, stored_facet_cell(product_id))
 
-        # Update product average rating
-        if is_new:
-            self.product.total_ratings += 1
 
-        ratings = Rating.objects.filter(product=self.product)
-        self.product.average_rating = sum(r.rating for r in ratings) / len(ratings)
-        self.product.save()
+# lower bounds of the price buckets used for facet counts
+PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+
+
+def facet_cell(price, stock, average_rating):
+    """(price bucket, rating bucket, in stock) a product is counted under"""
+    price_bucket = max(0, bisect.bisect_right(PRICE_BUCKETS, price) - 1)
+    rating_bucket = min(5, max(0, math.floor(average_rating)))
+    return price_bucket, rating_bucket, bool(stock)
+
+
+def stored_facet_cell(product_id, lock=False):
+    """Facet cell of the product row as currently stored, None if there is none"""
+    products = Product.objects.filter(pk=product_id)
+    if lock:
+        products = products.select_for_update()
+    row = products.values_list("price", "stock", "average_rating").first()
+    return None if row is None else facet_cell(*row)
+
+
+def move_facet_cell(old_cell, new_cell):
+    """Move one product between facet cells; either side may be None"""
+    if old_cell == new_cell:
+        return
+    if old_cell is not None:
+        ProductFacetCount.objects.filter(
+            price_bucket=old_cell[0], rating_bucket=old_cell[1], in_stock=old_cell[2]
+        ).update(count=F("count") - 1)
+    if new_cell is not None:
+        cell, created = ProductFacetCount.objects.get_or_create(
+            price_bucket=new_cell[0],
+            rating_bucket=new_cell[1],
+            in_stock=new_cell[2],
+            defaults={"count": 1},
+        )
+        if not created:
+            ProductFacetCount.objects.filter(pk=cell.pk).update(count=F("count") + 1)
+
+
+class ProductFacetCount(models.Model):
+    """Number of products per (price bucket, rating bucket, stock) cell.
+
+    Facet counts for any combination of filters are sums over these few rows,
+    so listing pages never COUNT the product table.
+    """
+
+    price_bucket = models.PositiveSmallIntegerField()
+    rating_bucket = models.PositiveSmallIntegerField()
+    in_stock = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("price_bucket", "rating_bucket", "in_stock")
+
+    def __str__(self):
+        return f"{self.price_bucket}/{self.rating_bucket}/{self.in_stock}: {self.count}"
+
+
+class ProductViewCount(models.Model):
+    """Detail page views per product, written in batches by product.counters"""
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="view_count"
+    )
+    views = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.views}"
+
+
+class ProductScore(models.Model):
+    """Materialized leaderboard scores, refreshed only for products that changed"""
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="score"
+    )
+    # Bayesian average of the ratings, see product.leaderboards
+    top_rated = models.FloatField(default=0)
+    # ratings within the last TRENDING_WINDOW_DAYS
+    trending = models.IntegerField(default=0)
+    # when the oldest of those leaves the window and the score must be redone
+    trending_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["top_rated"], name="score_top_rated_idx"),
+            models.Index(fields=["trending", "top_rated"], name="score_trending_idx"),
+            models.Index(fields=["trending_expires_at"], name="score_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.top_rated:.2f} / {self.trending}"
+
+
+class SimilarProduct(models.Model):
+    """A precomputed "customers also bought" neighbour of a product"""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="similar_products"
+    )
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        # also the index the detail view reads a product's neighbours with
+        unique_together = ("product", "rank")
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.similar_id} ({self.score:.3f})"
+
+
+class ProductTombstone(models.Model):
+    """A deleted product, kept so syncing clients learn about the deletion"""
+
+    product_id = models.PositiveBigIntegerField(primary_key=True)
+    change_seq = models.PositiveBigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.product_id} deleted at {self.change_seq}"
+
+
+class ProductChangeSequence(models.Model):
+    """The catalog change counter, a single row advanced by database triggers"""
+
+    value = models.PositiveBigIntegerField(default=0)
+    # tombstones up to here have been purged: older sync tokens must resync
+    purged_through = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.value)
+
+
+class StockReservation(models.Model):
+    """Units held back for a checkout; they return to stock unless confirmed in time"""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} until {self.expires_at}"
+
+
+class StoredBlob(models.Model):
+    """A file of the content-addressed media storage and how many rows use it"""
+
+    name = models.CharField(max_length=100, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    last_used = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["ref_count", "last_used"], name="blob_unused_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class ReportCluster(models.Model):
+    """Near-duplicate reports about the same product, moderated together"""
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="report_clusters",
+        null=True,
+        blank=True,
+    )
+    # taken from the report that started the cluster
+    report_type = models.CharField(max_length=20)
+    title = models.CharField(max_length=200)
+    # MinHash signature new reports are compared against, see product.clustering
+    signature = models.JSONField()
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.report_type} - {self.title}"
+
+
+class ReportBucket(models.Model):
+    """The hash of one LSH band of a cluster's signature, looked up by new reports"""
+
+    cluster = models.ForeignKey(
+        ReportCluster, on_delete=models.CASCADE, related_name="buckets"
+    )
+    # copied from the cluster so lookups stay within one product
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+        db_index=False,  # covered by report_bucket_lookup_idx
+    )
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "bucket"], name="report_bucket_lookup_idx"),
+        ]
 
 
 class Report(models.Model):
@@ -68,10 +420,34 @@ class Report(models.Model):
     report_type = models.CharField(max_length=20, choices=REPORT_TYPES)
     title = models.CharField(max_length=200)
     description = models.TextField()
-    evidence = models.FileField(upload_to="report_evidence/", null=True, blank=True)
+    evidence = models.FileField(
+        upload_to="report_evidence/", null=True, blank=True, storage=blob_storage
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # assigned when the report is created (product.clustering)
+    cluster = models.ForeignKey(
+        ReportCluster,
+        on_delete=models.SET_NULL,
+        related_name="reports",
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,  # covered by report_cluster_status_idx
+    )
+
+    class Meta:
+        indexes = [
+            # the moderation queue: one status, oldest first
+            models.Index(
+                fields=["status", "created_at"], name="report_status_created_idx"
+            ),
+            # reports of a cluster in the status the cluster queue shows
+            models.Index(
+                fields=["cluster", "status"], name="report_cluster_status_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.report_type} - {self.title}"
@@ -0,0 +1,54 @@
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+
+from .models import Report
+
+REPORT_STATUSES = [value for value, _ in Report.STATUS_CHOICES]
+REPORT_TYPES = [value for value, _ in Report.REPORT_TYPES]
+
+# status -> statuses a report may be moved to from it
+REPORT_TRANSITIONS = {
+    "PENDING": {"INVESTIGATING", "RESOLVED", "CLOSED"},
+    "INVESTIGATING": {"PENDING", "RESOLVED", "CLOSED"},
+    "RESOLVED": {"INVESTIGATING", "CLOSED"},
+    "CLOSED": {"INVESTIGATING"},  # reopened
+}
+
+
+def parse_queue_filters(params):
+    """Report filters from the query string of the moderation queue.
+
+    The queue shows one status at a time (PENDING unless asked otherwise),
+    so every page is a range of the (status, created_at) index.
+    """
+    filters = {"status": params.get("status", "PENDING").upper()}
+    if filters["status"] not in REPORT_STATUSES:
+        raise ParseError("Status must be one of: %s." % ", ".join(REPORT_STATUSES))
+    if params.get("report_type"):
+        filters["report_type"] = params["report_type"].upper()
+        if filters["report_type"] not in REPORT_TYPES:
+            raise ParseError(
+                "Report type must be one of: %s." % ", ".join(REPORT_TYPES)
+            )
+    for name in ("product", "cluster"):
+        if params.get(name):
+            try:
+                filters[f"{name}_id"] = int(params[name])
+            except ValueError:
+                raise ParseError(f"{name.capitalize()} must be an id.")
+    return filters
+
+
+def transition_reports(reports, status):
+    """Move reports to `status` in a single UPDATE; returns the number moved.
+
+    Reports whose status cannot move to `status`, including those already
+    in it, are left alone.
+    """
+    sources = [
+        source for source, targets in REPORT_TRANSITIONS.items() if status in targets
+    ]
+    # queryset updates skip auto_now
+    return reports.filter(status__in=sources).update(
+        status=status, updated_at=timezone.now()
+    )
@@ -0,0 +1,169 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination that seeks on (ordering field, id) instead of OFFSET.
+
+    The cursor is an opaque token holding the sort key of the last row of the
+    previous page, so fetching page 1000 costs the same as fetching page 1.
+    """
+
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    # subclasses list the fields a client may sort on ("-" prefix = descending)
+    ordering_fields = ("id",)
+    ordering_aliases = {}
+    default_ordering = "id"
+    page_size = 20
+    max_page_size = 100
+    # absolute URL the next link points at; defaults to the current request
+    base_url = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request)
+        self.limit = self.get_page_size(request)
+
+        field_name, descending = self._split_ordering(self.ordering)
+        self.field = queryset.model._meta.get_field(field_name)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self._seek(cursor, descending))
+
+        order_by = [self.ordering]
+        if field_name != "id":
+            # tie-breaker so rows sharing the same value are never skipped
+            order_by.append("-id" if descending else "id")
+
+        rows = list(queryset.order_by(*order_by)[: self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        self.page = rows[: self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if not ordering:
+            return self.default_ordering
+        ordering = self.ordering_aliases.get(ordering, ordering)
+        if ordering.lstrip("-") not in self.ordering_fields:
+            raise ParseError(f"Unsupported ordering '{ordering}'.")
+        return ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        token = self.encode_cursor(
+            {
+                "o": self.ordering,
+                "v": self.field.value_to_string(last),
+                "id": last.pk,
+            }
+        )
+        url = self.base_url or self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def encode_cursor(self, cursor):
+        raw = json.dumps(cursor, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+            # a cursor is only meaningful for the ordering it was issued with
+            if cursor["o"] != self.ordering:
+                raise ValueError
+            cursor["v"] = self.field.to_python(cursor["v"])
+            cursor["id"] = int(cursor["id"])
+        except (
+            binascii.Error,
+            DjangoValidationError,
+            KeyError,
+            TypeError,
+            ValueError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def _split_ordering(self, ordering):
+        return ordering.lstrip("-"), ordering.startswith("-")
+
+    def _seek(self, cursor, descending):
+        op = "lt" if descending else "gt"
+        name = self.field.name
+        if name == "id":
+            return Q(**{f"id__{op}": cursor["id"]})
+        return Q(**{f"{name}__{op}": cursor["v"]}) | Q(
+            **{name: cursor["v"], f"id__{op}": cursor["id"]}
+        )
+
+
+class ProductCursorPagination(KeysetPagination):
+    ordering_fields = ("id", "price", "average_rating")
+
+    @property
+    def page_size(self):
+        return settings.PRODUCT_PAGE_SIZE
+
+    @property
+    def max_page_size(self):
+        return settings.PRODUCT_MAX_PAGE_SIZE
+
+
+class RatingCursorPagination(KeysetPagination):
+    ordering_fields = ("id", "created_at", "rating")
+    ordering_aliases = {
+        "newest": "-created_at",
+        "highest": "-rating",
+        "lowest": "rating",
+    }
+    default_ordering = "-created_at"
+
+    @property
+    def page_size(self):
+        return settings.RATING_PAGE_SIZE
+
+    @property
+    def max_page_size(self):
+        return settings.RATING_MAX_PAGE_SIZE
+
+
+class ReportCursorPagination(KeysetPagination):
+    ordering_fields = ("id", "created_at")
+    ordering_aliases = {"oldest": "created_at", "newest": "-created_at"}
+    default_ordering = "created_at"
+
+    @property
+    def page_size(self):
+        return settings.REPORT_PAGE_SIZE
+
+    @property
+    def max_page_size(self):
+        return settings.REPORT_MAX_PAGE_SIZE
@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from .cache import invalidate_catalog
+from .counters import BufferedCounter
+from .leaderboards import refresh_scores
+from .models import Rating, apply_rating_delta
+
+# Rating submissions write only their Rating row. The change in stars goes
+# into a per-process buffer as {(product id, aggregate column): change}, and
+# a flush sums what was queued per product into one apply_rating_delta()
+# UPDATE, so a burst of reviews on one product costs a single product write
+# per RATING_AGGREGATE_FLUSH_INTERVAL. The ratings themselves are listed as
+# soon as they are saved; only the averages and counts lag behind.
+#
+# What a crashed worker had queued is lost until recompute_ratings runs.
+
+
+def write_rating_deltas(counts):
+    """Apply the queued changes, one aggregate UPDATE per product"""
+    deltas = defaultdict(lambda: {"rating_sum": 0, "total_ratings": 0})
+    for (product_id, column), change in counts.items():
+        delta = deltas[product_id]
+        delta[column] = delta.get(column, 0) + change
+
+    with transaction.atomic():
+        for product_id, delta in deltas.items():
+            # a product deleted since is simply not updated
+            apply_rating_delta(product_id, delta)
+
+    invalidate_catalog(deltas, refresh_suggestions=True)
+    refresh_scores(deltas)
+
+
+rating_aggregates = BufferedCounter(
+    write_rating_deltas,
+    flush_size="RATING_AGGREGATE_FLUSH_SIZE",
+    flush_interval="RATING_AGGREGATE_FLUSH_INTERVAL",
+    timer=True,
+)
+
+
+def queue_rating_delta(product_id, delta):
+    """apply_delta for Rating.save() that leaves the UPDATE to the next flush"""
+    counts = {(product_id, column): change for column, change in delta.items()}
+    # queued once committed, so a rolled back rating is never counted
+    transaction.on_commit(lambda: rating_aggregates.add(counts))
+
+
+def submit_rating(user, product_id, stars, comment=""):
+    """Create or replace a user's rating of a product.
+
+    Returns (rating, created). The product aggregates follow within
+    RATING_AGGREGATE_FLUSH_INTERVAL seconds.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                rating = (
+                    Rating.objects.select_for_update()
+                    .filter(user=user, product_id=product_id)
+                    .first()
+                )
+                created = rating is None
+                if created:
+                    rating = Rating(user=user, product_id=product_id)
+                rating.rating = stars
+                rating.comment = comment
+                rating.save(apply_delta=queue_rating_delta)
+            return rating, created
+        except IntegrityError:
+            # the same user's concurrent first rating won; update that one
+            if attempt:
+                raise
@@ -0,0 +1,107 @@
+import heapq
+import itertools
+import math
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Mod
+
+from account.models import OrderModel
+
+from .cache import invalidate_catalog
+from .models import Product, SimilarProduct
+
+
+def product_ids_by_name():
+    # orders name the product they are for rather than pointing at it
+    ids = {}
+    for product_id, name in Product.objects.order_by("-id").values_list("id", "name"):
+        ids[name.strip().casefold()] = product_id  # the oldest product wins
+    return ids
+
+
+def iter_baskets(chunk_size):
+    """Yield the products each customer has paid for, one customer at a time.
+
+    Orders are streamed sorted by customer, so only one basket is in memory.
+    Baskets are capped at the SIMILAR_PRODUCTS_MAX_BASKET most recent
+    products, which bounds the pairs a single heavy buyer can contribute.
+    """
+    ids = product_ids_by_name()
+    max_basket = settings.SIMILAR_PRODUCTS_MAX_BASKET
+    orders = (
+        OrderModel.objects.filter(paid_status=True, user__isnull=False)
+        .exclude(ordered_item__isnull=True)
+        .order_by("user_id", "id")
+        .values_list("user_id", "ordered_item")
+        .iterator(chunk_size=chunk_size)
+    )
+    for _, rows in itertools.groupby(orders, key=itemgetter(0)):
+        basket = {}
+        for _, item in rows:
+            product_id = ids.get(item.strip().casefold())
+            if product_id is not None:
+                # re-inserting moves a product bought again to the end
+                basket.pop(product_id, None)
+                basket[product_id] = True
+        if len(basket) > 1:
+            yield list(basket)[-max_basket:]
+
+
+def build_similar_products(top_k, min_support, shards=1, chunk_size=2000):
+    """Rebuild the "customers also bought" table from the order history.
+
+    The co-occurrence matrix is kept sparse, as one Counter of neighbours per
+    product. With several shards the orders are read once per shard and each
+    pass only keeps the rows of the products in that shard, which divides the
+    memory needed by the number of shards. Neighbours are ranked by cosine
+    similarity, so best sellers do not top every list.
+    """
+    written = 0
+    for shard in range(shards):
+        co_counts = defaultdict(Counter)
+        buyers = Counter()
+        for basket in iter_baskets(chunk_size):
+            buyers.update(basket)
+            for product_id in basket:
+                if product_id % shards == shard:
+                    # counts the product itself too, dropped below
+                    co_counts[product_id].update(basket)
+
+        rows = []
+        for product_id, neighbours in co_counts.items():
+            del neighbours[product_id]
+            scored = (
+                (count / math.sqrt(buyers[product_id] * buyers[other]), other)
+                for other, count in neighbours.items()
+                if count >= min_support
+            )
+            for rank, (score, other) in enumerate(heapq.nlargest(top_k, scored)):
+                rows.append(
+                    SimilarProduct(
+                        product_id=product_id, similar_id=other, rank=rank, score=score
+                    )
+                )
+        del co_counts
+
+        with transaction.atomic():
+            SimilarProduct.objects.alias(shard=Mod("product_id", shards)).filter(
+                shard=shard
+            ).delete()
+            SimilarProduct.objects.bulk_create(rows, batch_size=1000)
+        written += len(rows)
+
+    invalidate_catalog()
+    return written
+
+
+def similar_products(product_id):
+    """Precomputed neighbours of one product: a single (product, rank) index scan"""
+    return [
+        neighbour.similar
+        for neighbour in SimilarProduct.objects.filter(product_id=product_id)
+        .select_related("similar")
+        .order_by("rank")
+    ]
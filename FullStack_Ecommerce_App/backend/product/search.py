@@ -0,0 +1,121 @@
+import html
+import re
+
+from django.db import connection, connections
+
+from .models import Product
+
+# FTS5 table created by migration 0015_product_search_index
+SEARCH_TABLE = "product_search"
+
+# Same triggers as the migration. SQLite drops triggers whenever Django
+# rebuilds product_product for a schema change, so they are re-created after
+# every migrate (see ProductConfig.ready).
+SEARCH_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON product_product
+    BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON product_product
+    BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au
+    AFTER UPDATE OF name, description ON product_product
+    BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {SEARCH_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+# Matches are marked with control characters and the text is HTML-escaped
+# before they become <mark> tags: names and descriptions come from admins
+# and supplier feeds, and clients render the highlights as HTML.
+MARK_START, MARK_END = "\x02", "\x03"
+
+SEARCH_SQL = f"""
+    SELECT rowid,
+           highlight({SEARCH_TABLE}, 0, char(2), char(3)),
+           snippet({SEARCH_TABLE}, 1, char(2), char(3), '...', 12)
+    FROM {SEARCH_TABLE}
+    WHERE {SEARCH_TABLE} MATCH %s
+    ORDER BY bm25({SEARCH_TABLE}, 10.0, 1.0)
+    LIMIT %s OFFSET %s
+"""
+
+
+def mark_up(text):
+    """HTML for a highlighted name or snippet"""
+    return (
+        html.escape(text)
+        .replace(MARK_START, "<mark>")
+        .replace(MARK_END, "</mark>")
+    )
+
+
+def has_search_index():
+    return connection.vendor == "sqlite"
+
+
+def ensure_search_triggers(using="default", **kwargs):
+    """post_migrate hook putting back triggers lost to a table rebuild"""
+    db = connections[using]
+    if db.vendor != "sqlite" or SEARCH_TABLE not in db.introspection.table_names():
+        return
+    with db.cursor() as cursor:
+        for statement in SEARCH_TRIGGERS_SQL:
+            cursor.execute(statement)
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix.
+
+    Words are quoted, so FTS5 operators typed by a user are searched literally
+    instead of raising syntax errors.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = ['"%s"' % word for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_products(text, limit, offset=0):
+    """Best matches for `text` as (product_id, highlighted name, description snippet)"""
+    match = build_match_query(text)
+    if match is None:
+        return []
+
+    if not has_search_index():
+        # other databases get an unranked LIKE scan and no highlighting
+        products = Product.objects.order_by("id")
+        for word in re.findall(r"\w+", text):
+            products = products.filter(name__icontains=word)
+        rows = products.values_list("id", "name")[offset : offset + limit]
+        return [(product_id, html.escape(name), "") for product_id, name in rows]
+
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL, [match, limit, offset])
+        return [
+            (product_id, mark_up(name), mark_up(snippet))
+            for product_id, name, snippet in cursor.fetchall()
+        ]
+
+
+def rebuild_search_index():
+    """Repopulate the whole index from product_product in one statement"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"
+        )
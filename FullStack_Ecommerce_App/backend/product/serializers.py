@@ -1,5 +1,19 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import Product, Rating, Report
+from .models import Product, Rating, Report, ReportCluster, StockReservation
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer taking an optional `fields` argument to limit the output."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
 
 
 class RatingSerializer(serializers.ModelSerializer):
@@ -41,6 +55,7 @@ class ReportSerializer(serializers.ModelSerializer):
             "description",
             "evidence",
             "status",
+            "cluster",
             "created_at",
             "updated_at",
         ]
@@ -54,23 +69,129 @@ class ReportSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ReportClusterSerializer(serializers.ModelSerializer):
+    report_count = serializers.IntegerField(read_only=True)
+    last_reported_at = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = ReportCluster
+        fields = [
+            "id",
+            "product",
+            "report_type",
+            "title",
+            "report_count",
+            "created_at",
+            "last_reported_at",
+        ]
+
+
+class ReportTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+    status = serializers.ChoiceField(choices=Report.STATUS_CHOICES)
+
+    def validate_ids(self, ids):
+        if len(ids) > settings.REPORT_TRANSITION_MAX_IDS:
+            raise serializers.ValidationError(
+                f"At most {settings.REPORT_TRANSITION_MAX_IDS} reports at a time."
+            )
+        return ids
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = StockReservation
+        fields = ["id", "product", "quantity", "created_at", "expires_at"]
+        read_only_fields = ["product", "created_at", "expires_at"]
+
+
+class InventorySerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=0)
+    reserved = serializers.IntegerField(read_only=True)
+
+
+class ProductEditSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    version = serializers.IntegerField(min_value=1)
+    price = serializers.DecimalField(
+        max_digits=8, decimal_places=2, min_value=0, required=False
+    )
+    description = serializers.CharField(allow_blank=True, required=False)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+
+class ProductBulkEditSerializer(serializers.Serializer):
+    products = ProductEditSerializer(many=True, allow_empty=False)
+
+    def validate_products(self, products):
+        if len(products) > settings.PRODUCT_BULK_EDIT_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"At most {settings.PRODUCT_BULK_EDIT_MAX_ITEMS} products at a time."
+            )
+        edits = {}
+        for edit in products:
+            product_id = edit.pop("id")
+            if product_id in edits:
+                raise serializers.ValidationError(
+                    f"Product {product_id} is edited more than once."
+                )
+            edits[product_id] = edit
+        return edits
+
+
+class ProductSerializer(DynamicFieldsModelSerializer):
     ratings = RatingSerializer(many=True, read_only=True)
     average_rating = serializers.DecimalField(
         max_digits=3, decimal_places=2, read_only=True
     )
     total_ratings = serializers.IntegerField(read_only=True)
+    rating_histogram = serializers.DictField(
+        child=serializers.IntegerField(), read_only=True
+    )
+    image_variants = serializers.SerializerMethodField()
+    # units on hand are written, never shown; `stock` follows them
+    quantity = serializers.IntegerField(min_value=0, required=False, write_only=True)
 
     class Meta:
         model = Product
         fields = [
             "id",
+            "sku",
             "name",
             "description",
             "price",
             "stock",
+            "quantity",
             "image",
+            "image_variants",
             "average_rating",
             "total_ratings",
+            "rating_histogram",
             "ratings",
+            "updated_at",
+            "version",
         ]
+        read_only_fields = ["stock"]
+
+    def validate(self, attrs):
+        # as set_quantity() does
+        if "quantity" in attrs:
+            attrs["stock"] = attrs["quantity"] > 0
+        return attrs
+
+    def get_image_variants(self, obj):
+        """URLs of the resized copies; empty until they have been rendered"""
+        request = self.context.get("request")
+        variants = {}
+        for size_name, by_format in obj.image_variants.items():
+            variants[size_name] = {}
+            for fmt, name in by_format.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[size_name][fmt] = url
+        return variants
@@ -0,0 +1,125 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog
+from .models import (
+    Product,
+    Rating,
+    Report,
+    apply_rating_delta,
+    move_facet_cell,
+    rating_delta,
+    stored_facet_cell,
+)
+from .clustering import assign_cluster
+from .leaderboards import refresh_scores
+from .storage import change_blob_references
+
+# file fields backed by the content-addressed storage
+BLOB_FIELDS = {Product: "image", Report: "evidence"}
+
+
+# deletes go through a signal rather than Rating.delete() so that queryset
+# deletes (admin bulk actions) and cascades from User are counted as well
+@receiver(post_delete, sender=Rating)
+def remove_rating_from_aggregates(sender, instance, origin=None, **kwargs):
+    # nothing to keep in sync when the product itself is being deleted
+    if isinstance(origin, Product) or (
+        isinstance(origin, QuerySet) and origin.model is Product
+    ):
+        return
+
+    product_id, rating = getattr(
+        instance, "_counted", (instance.product_id, instance.rating)
+    )
+    if product_id is not None:
+        apply_rating_delta(product_id, rating_delta(removed=rating))
+
+
+# facet cells are read back from the database on both sides of a save, since
+# the instance being saved may hold stale rating aggregates
+@receiver(pre_save, sender=Product)
+def remember_facet_cell(sender, instance, **kwargs):
+    instance._stored_facet_cell = (
+        stored_facet_cell(instance.pk) if instance.pk is not None else None
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts(sender, instance, **kwargs):
+    old_cell = getattr(instance, "_stored_facet_cell", None)
+    move_facet_cell(old_cell, stored_facet_cell(instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_facet_counts(sender, instance, **kwargs):
+    move_facet_cell(instance.facet_cell(), None)
+
+
+# names change with product writes, ranking scores with rating writes, so
+# both refresh the autocomplete entries as well
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    invalidate_catalog([instance.pk], refresh_suggestions=True)
+
+
+@receiver([post_save, post_delete], sender=Rating)
+def invalidate_rated_product(sender, instance, **kwargs):
+    # a rating moved to another product changes the previous product too
+    previous_product_id = getattr(instance, "_counted", (None, None))[0]
+    invalidate_catalog(
+        {instance.product_id, previous_product_id} - {None}, refresh_suggestions=True
+    )
+
+
+@receiver([post_save, post_delete], sender=Rating)
+def refresh_rated_product_scores(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Product) or (
+        isinstance(origin, QuerySet) and origin.model is Product
+    ):
+        return
+    # queued aggregates are not written yet; the flush refreshes the scores
+    if getattr(instance, "_aggregates_deferred", False):
+        return
+    previous_product_id = getattr(instance, "_counted", (None, None))[0]
+    product_ids = {instance.product_id, previous_product_id} - {None}
+    transaction.on_commit(lambda: refresh_scores(product_ids))
+
+
+# blob reference counts follow the stored file names, read back from the
+# database before the save like the facet cells above
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Report)
+def remember_stored_blob(sender, instance, **kwargs):
+    instance._stored_blob = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list(BLOB_FIELDS[sender], flat=True)
+        .first()
+        if instance.pk is not None
+        else None
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Report)
+def update_blob_references(sender, instance, **kwargs):
+    old_name = getattr(instance, "_stored_blob", None) or None
+    new_name = getattr(instance, BLOB_FIELDS[sender]).name or None
+    if old_name != new_name:
+        change_blob_references(new_name, 1)
+        change_blob_references(old_name, -1)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Report)
+def release_blob_reference(sender, instance, **kwargs):
+    change_blob_references(getattr(instance, BLOB_FIELDS[sender]).name, -1)
+
+
+@receiver(post_save, sender=Report)
+def cluster_new_report(sender, instance, created, raw=False, **kwargs):
+    # reports created in bulk are clustered by rebuild_report_clusters
+    if created and not raw:
+        assign_cluster(instance)
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+MAX_EXTENSION_LENGTH = 10
+
+
+def blob_name(digest, extension):
+    # fan out over two directory levels so no directory grows huge
+    directory = f"{settings.BLOB_STORAGE_DIR}/{digest[:2]}/{digest[2:4]}"
+    return f"{directory}/{digest}{extension}"
+
+
+@deconstructible(path="product.storage.ContentAddressedStorage")
+class ContentAddressedStorage(FileSystemStorage):
+    """Media storage that names every file by the SHA-256 of its content.
+
+    Uploads are hashed while they are streamed to a temporary file, so
+    identical uploads end up as one file on disk (and one URL in caches).
+    Files an upload handler has already stored (StoredBlobFile) are kept
+    where they are.
+    Each stored file has a StoredBlob row whose ref_count is kept by the
+    model signals; unreferenced blobs are removed by `collect_blobs`.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # the final name comes from the content in _save(); a file already
+        # stored under it holds the very same bytes
+        return name
+
+    def _save(self, name, content):
+        # already streamed into place by an upload handler (product.uploads)
+        if isinstance(content, StoredBlobFile):
+            return content.blob_name
+
+        writer = BlobWriter(self, name)
+        try:
+            if hasattr(content, "seek"):
+                content.seek(0)
+            for chunk in content.chunks():
+                writer.write(chunk)
+            return writer.commit()
+        except BaseException:
+            writer.discard()
+            raise
+
+
+class BlobWriter:
+    """A blob written chunk by chunk and hashed in the same pass.
+
+    Chunks go to a temporary file next to the blobs, so commit() only has
+    to rename it to its content address once the digest is known.
+    """
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.extension = os.path.splitext(name)[1].lower()[:MAX_EXTENSION_LENGTH]
+        self.digest = hashlib.sha256()
+        self.size = 0
+        scratch = storage.path(os.path.join(settings.BLOB_STORAGE_DIR, "tmp"))
+        os.makedirs(scratch, exist_ok=True)
+        fd, self.temporary = tempfile.mkstemp(dir=scratch)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        self.digest.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """Move the file to its content address; returns the storage name"""
+        self.file.close()
+        digest = self.digest.hexdigest()
+        name = blob_name(digest, self.extension)
+        record_blob(digest, name, self.size)
+        path = self.storage.path(name)
+        if os.path.exists(path):
+            os.remove(self.temporary)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(self.temporary, self.storage.file_permissions_mode or 0o644)
+            os.replace(self.temporary, path)
+        return name
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temporary):
+            os.remove(self.temporary)
+
+
+class StoredBlobFile(UploadedFile):
+    """An upload already written to the blob storage as `blob_name`"""
+
+    def __init__(self, storage, blob_name, name, size, content_type, charset=None):
+        self.blob_name = blob_name
+        super().__init__(storage.open(blob_name), name, content_type, size, charset)
+
+
+def record_blob(digest, name, size):
+    """Register a stored blob, or mark an existing one as just used"""
+    from .models import StoredBlob
+
+    now = timezone.now()
+    # last_used keeps a re-uploaded blob out of the grace window of
+    # collect_blobs while its new reference is being saved
+    if not StoredBlob.objects.filter(name=name).update(last_used=now):
+        StoredBlob.objects.get_or_create(
+            name=name, defaults={"digest": digest, "size": size, "last_used": now}
+        )
+
+
+def change_blob_references(name, delta):
+    """Add delta to the reference count of a blob; other file names are ignored"""
+    from .models import StoredBlob
+
+    if name:
+        StoredBlob.objects.filter(name=name).update(
+            ref_count=F("ref_count") + delta, last_used=timezone.now()
+        )
+
+
+blob_storage = ContentAddressedStorage()
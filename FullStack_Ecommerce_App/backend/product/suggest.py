@@ -0,0 +1,159 @@
+import bisect
+import heapq
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Product
+
+MAX_KEY_LENGTH = 64
+
+
+def name_keys(name):
+    """Lookup keys for a product name: the name from each word onwards.
+
+    "Apple Watch Strap" gives "apple watch strap", "watch strap" and "strap",
+    so typing the start of any word finds the product.
+    """
+    words = re.findall(r"\w+", name.casefold())
+    return {" ".join(words[i:])[:MAX_KEY_LENGTH] for i in range(len(words))}
+
+
+def normalize_prefix(prefix):
+    return " ".join(re.findall(r"\w+", prefix.casefold()))
+
+
+class PrefixIndex:
+    """In-process autocomplete index over product names.
+
+    Keys live in a sorted list searched with bisect, so a lookup is a binary
+    search plus a scan of the matching range. The index is built lazily,
+    patched in place by product signals of this process and rebuilt after
+    SUGGEST_INDEX_MAX_AGE seconds to pick up writes made by other workers.
+    Only one thread rebuilds at a time; the others keep answering from the
+    old index meanwhile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._keys = []  # sorted (key, product_id)
+        self._products = {}  # product_id -> (name, average_rating, total_ratings)
+        self._built_at = None
+
+    def suggest(self, prefix, limit):
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            matches = set()
+            keys = self._keys
+            i = bisect.bisect_left(keys, (prefix,))
+            while i < len(keys) and keys[i][0].startswith(prefix):
+                matches.add(keys[i][1])
+                i += 1
+
+            best = heapq.nlargest(
+                limit, matches, key=lambda product_id: self._products[product_id][1:]
+            )
+            return [
+                {"id": product_id, "name": self._products[product_id][0]}
+                for product_id in best
+            ]
+
+    def rebuild(self):
+        # past the size cap the least reviewed products are left out
+        rows = Product.objects.order_by("-total_ratings", "id").values_list(
+            "id", "name", "average_rating", "total_ratings"
+        )
+        rows = rows[: settings.SUGGEST_INDEX_MAX_PRODUCTS]
+        keys, products = [], {}
+        for product_id, name, average_rating, total_ratings in rows.iterator():
+            products[product_id] = (name, average_rating, total_ratings)
+            keys.extend((key, product_id) for key in name_keys(name))
+        keys.sort()
+
+        with self._lock:
+            self._keys, self._products = keys, products
+            self._built_at = time.monotonic()
+
+    def refresh_product(self, product_id):
+        """Re-read one product after a write and patch it into the index"""
+        if self._built_at is None:
+            return
+        row = (
+            Product.objects.filter(pk=product_id)
+            .values_list("name", "average_rating", "total_ratings")
+            .first()
+        )
+
+        with self._lock:
+            self._remove(product_id)
+            if row is None:
+                return
+            if len(self._products) >= settings.SUGGEST_INDEX_MAX_PRODUCTS:
+                return
+            self._products[product_id] = row
+            for key in name_keys(row[0]):
+                bisect.insort(self._keys, (key, product_id))
+
+    def invalidate(self):
+        """Drop the whole index after bulk writes; the next lookup rebuilds it"""
+        with self._lock:
+            self._built_at = None
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "products": len(self._products),
+                "keys": len(self._keys),
+                "memory_bytes": self._memory_bytes(),
+                "age_seconds": (
+                    None
+                    if self._built_at is None
+                    else round(time.monotonic() - self._built_at, 1)
+                ),
+            }
+
+    def _ensure_fresh(self):
+        if not self._is_stale():
+            return
+        # with nothing to serve yet, wait for the thread building the index
+        if not self._rebuild_lock.acquire(blocking=not self._products):
+            return
+        try:
+            if self._is_stale():  # not rebuilt while this thread waited
+                self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def _is_stale(self):
+        built_at = self._built_at
+        max_age = settings.SUGGEST_INDEX_MAX_AGE
+        return built_at is None or time.monotonic() - built_at > max_age
+
+    def _remove(self, product_id):
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        for key in name_keys(entry[0]):
+            i = bisect.bisect_left(self._keys, (key, product_id))
+            if i < len(self._keys) and self._keys[i] == (key, product_id):
+                del self._keys[i]
+
+    def _memory_bytes(self):
+        # approximate: containers plus the objects they own
+        size = sys.getsizeof(self._keys) + sys.getsizeof(self._products)
+        for key in self._keys:
+            size += sys.getsizeof(key) + sys.getsizeof(key[0])
+        for entry in self._products.values():
+            size += sys.getsizeof(entry) + sys.getsizeof(entry[0])
+        return size
+
+
+suggest_index = PrefixIndex()
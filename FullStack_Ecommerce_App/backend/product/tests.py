@@ -1,6 +1,19 @@
 from account import views
 from django.http import response
-from .models import Product
+from .models import (
+    Product,
+    ProductFacetCount,
+    ProductScore,
+    ProductTombstone,
+    ProductViewCount,
+    Rating,
+    ReportCluster,
+    SimilarProduct,
+    Report,
+    StockReservation,
+    StoredBlob,
+)
+from account.models import OrderModel
 from django.test import TestCase, Client
 from django.urls import reverse
 from rest_framework.test import APITestCase
@@ -9,6 +22,34 @@ from rest_framework.test import APIRequestFactory
 from .views import ProductCreateView, ProductDeleteView, ProductEditView
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.conf import settings
+from django.contrib import admin
+from django.utils import timezone
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from .admin import ProductAdmin
+from .cache import SingleFlightCache, get_catalog_version
+from .editing import bulk_edit_products
+from .counters import BufferedCounter, view_counter, write_view_counts
+from .clustering import minhash, similarity
+from .images import save_variants
+from .ratings import rating_aggregates
+from .inventory import put_back_stock, take_stock
+from .suggest import PrefixIndex, suggest_index
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from PIL import Image
+import csv
+import datetime
+import json
 
 
 class ProductApiTest(TestCase):
@@ -202,3 +243,1871 @@ class ProductApisAuthTest(ProductApisSetUp):
         response = view(request, 1)
         self.assertEqual(response.status_code, 403) # Forbidden
 
+
+
+class ProductListPaginationTest(TestCase):
+
+    def setUp(self):
+        # a few price ties so the id tie-breaker gets exercised
+        for i in range(7):
+            Product.objects.create(
+                name=f"Product {i}",
+                description="paginated",
+                price=100 + (i % 3),
+                stock=True,
+            )
+
+    def collect_pages(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        return seen
+
+    def test_cursor_walk_covers_every_product_once(self):
+        seen = self.collect_pages("/api/products/?ordering=-price&page_size=2")
+        expected = list(
+            Product.objects.order_by("-price", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_cursor_walk_over_repeating_averages(self):
+        # 13/3 = 4.333...; stored unrounded, a "> 4.33" cursor found the same
+        # rows again and the walk never ended
+        raters = [
+            User.objects.create_user(username=f"rater{i}", password="pass1234")
+            for i in range(3)
+        ]
+        for product in Product.objects.all()[:4]:
+            for user, stars in zip(raters, (5, 4, 4)):
+                Rating.objects.create(user=user, product=product, rating=stars)
+
+        for ordering in ("average_rating", "-average_rating"):
+            seen = self.collect_pages(
+                f"/api/products/?ordering={ordering}&page_size=1"
+            )
+            self.assertCountEqual(seen, Product.objects.values_list("id", flat=True))
+        self.assertEqual(Product.objects.filter(average_rating="4.33").count(), 4)
+
+    def test_page_size_is_capped(self):
+        with self.settings(PRODUCT_MAX_PAGE_SIZE=3):
+            response = self.client.get("/api/products/?page_size=1000")
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_fields_option_skips_ratings(self):
+        response = self.client.get("/api/products/?fields=id,name,price")
+        self.assertEqual(
+            set(response.data["results"][0]), {"id", "name", "price"}
+        )
+
+    def test_invalid_cursor_and_ordering(self):
+        self.assertEqual(self.client.get("/api/products/?cursor=junk").status_code, 404)
+        self.assertEqual(self.client.get("/api/products/?ordering=name").status_code, 400)
+
+
+class ProductQueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f"rater{i}", email=f"rater{i}@example.com")
+            for i in range(1000)
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=10, stock=True)
+            for i in range(200)
+        )
+        cls.hot_product = products[0]
+
+        # 5 ratings on every product plus 1000 on the hot one
+        ratings = [
+            Rating(user=users[(p * 5 + i) % 1000], product=product, rating=4)
+            for p, product in enumerate(products[1:])
+            for i in range(5)
+        ]
+        ratings += [Rating(user=user, product=cls.hot_product, rating=5) for user in users]
+        Rating.objects.bulk_create(ratings)
+
+    def setUp(self):
+        # bulk_create sends no signals, so make sure no earlier response is cached
+        cache.clear()
+        # start with an empty view buffer so no flush lands in a measured request
+        view_counter.flush()
+
+    def test_product_list_query_count_is_constant(self):
+        # products page + ratings joined with their users
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/products/?page_size=100")
+        self.assertEqual(len(response.data["results"]), 100)
+        self.assertEqual(len(response.data["results"][0]["ratings"]), 1000)
+
+    def test_product_list_without_ratings_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.client.get("/api/products/?page_size=100&fields=id,name")
+
+    def test_product_detail_query_count_is_constant(self):
+        # product, ratings joined with their users, similar products
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/product/{self.hot_product.id}/")
+        self.assertEqual(len(response.data["ratings"]), 1000)
+
+
+class RatingAggregateTest(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Desk", price=250, stock=True)
+        self.alice = User.objects.create_user(username="alice", password="alice1234")
+        self.bob = User.objects.create_user(username="bob", password="bob12345")
+
+    def assertAggregates(self, average, total):
+        self.product.refresh_from_db()
+        self.assertEqual(str(self.product.average_rating), average)
+        self.assertEqual(self.product.total_ratings, total)
+
+    def test_create_update_and_delete_keep_aggregates_in_sync(self):
+        first = Rating.objects.create(user=self.alice, product=self.product, rating=5)
+        Rating.objects.create(user=self.bob, product=self.product, rating=2)
+        self.assertAggregates("3.50", 2)
+
+        first = Rating.objects.get(pk=first.pk)
+        first.rating = 3
+        first.save()
+        self.assertAggregates("2.50", 2)
+
+        first.delete()
+        self.assertAggregates("2.00", 1)
+
+        Rating.objects.filter(product=self.product).delete()
+        self.assertAggregates("0.00", 0)
+
+    def test_recompute_command_repairs_drift(self):
+        cache.clear()
+        Rating.objects.create(user=self.alice, product=self.product, rating=4)
+        Product.objects.filter(pk=self.product.pk).update(
+            average_rating=1, total_ratings=7, rating_sum=7
+        )
+        url = f"/api/product/{self.product.id}/"
+        self.assertEqual(self.client.get(url).data["average_rating"], "1.00")
+
+        call_command("recompute_ratings", stdout=StringIO())
+        self.assertAggregates("4.00", 1)
+        # the cached detail is dropped with the repair
+        self.assertEqual(self.client.get(url).data["average_rating"], "4.00")
+        self.assertEqual(self.product.rating_histogram, {5: 0, 4: 1, 3: 0, 2: 0, 1: 0})
+
+    def test_histogram_follows_rating_writes(self):
+        rating = Rating.objects.create(user=self.alice, product=self.product, rating=5)
+        Rating.objects.create(user=self.bob, product=self.product, rating=5)
+        rating.rating = 1
+        rating.save()
+
+        response = self.client.get(
+            f"/api/product/{self.product.id}/?fields=rating_histogram"
+        )
+        self.assertEqual(
+            response.data["rating_histogram"],
+            {"5": 1, "4": 0, "3": 0, "2": 0, "1": 1},
+        )
+
+
+class ProductRatingsPaginationTest(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Lamp", price=40, stock=True)
+        for i, stars in enumerate([3, 5, 1, 4, 5]):
+            user = User.objects.create_user(username=f"reviewer{i}", password="pass1234")
+            Rating.objects.create(user=user, product=self.product, rating=stars)
+
+    def test_ratings_sorted_by_highest_across_pages(self):
+        url = f"/api/product/{self.product.id}/ratings/?ordering=highest&page_size=2"
+        stars = []
+        while url:
+            response = self.client.get(url)
+            stars.extend(item["rating"] for item in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(stars, [5, 5, 4, 3, 1])
+
+    def test_detail_inlines_first_ratings_with_cursor(self):
+        response = self.client.get(f"/api/product/{self.product.id}/?ratings_limit=2")
+        self.assertEqual(len(response.data["ratings"]), 2)
+        self.assertIn(
+            f"/api/product/{self.product.id}/ratings/", response.data["ratings_next"]
+        )
+
+        rest = self.client.get(response.data["ratings_next"])
+        first_ids = [item["id"] for item in response.data["ratings"]]
+        rest_ids = [item["id"] for item in rest.data["results"]]
+        expected = Rating.objects.order_by("-created_at", "-id").values_list(
+            "id", flat=True
+        )
+        self.assertEqual(first_ids + rest_ids, list(expected))
+
+    def test_ratings_of_missing_product(self):
+        response = self.client.get("/api/product/9999/ratings/")
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name="Mouse", price=25, stock=True)
+
+    def test_repeat_reads_skip_the_database(self):
+        url = f"/api/product/{self.product.id}/"
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get("/api/products/")["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etags_roll_over_without_local_writes(self):
+        # another worker's write never reaches this process's cache, so the
+        # validator must expire by itself
+        with self.settings(CATALOG_CACHE_TIMEOUT=0.05):
+            cache.clear()
+            etag = self.client.get("/api/products/")["ETag"]
+            time.sleep(0.1)
+            response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_product_and_rating_writes_invalidate(self):
+        url = f"/api/product/{self.product.id}/"
+        etag = self.client.get(url)["ETag"]
+
+        self.product.name = "Wireless Mouse"
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["name"], "Wireless Mouse")
+
+        user = User.objects.create_user(username="carol", password="carol1234")
+        Rating.objects.create(user=user, product=self.product, rating=4)
+        response = self.client.get(url)
+        self.assertEqual(response.data["total_ratings"], 1)
+
+
+class SingleFlightCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.detail_cache = SingleFlightCache("test:single-flight")
+        self.builds = 0
+
+    def slow_build(self):
+        self.builds += 1
+        time.sleep(0.1)
+        return {"built": self.builds}
+
+    def test_concurrent_misses_build_once(self):
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self.detail_cache.get_or_build(1, self.slow_build)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(results, [{"built": 1}] * 5)
+        stats = self.detail_cache.get_stats()
+        self.assertEqual((stats["misses"], stats["coalesced"]), (1, 4))
+
+    def test_stale_copy_served_while_rebuilding(self):
+        self.detail_cache.get_or_build(1, self.slow_build)
+        self.detail_cache.invalidate(1)
+        cache.add("test:single-flight:lock:1", 1)  # another worker is rebuilding
+
+        self.assertEqual(self.detail_cache.get_or_build(1, self.slow_build), {"built": 1})
+        self.assertEqual(self.detail_cache.get_stats()["stale"], 1)
+
+        cache.delete("test:single-flight:lock:1")
+        self.assertEqual(self.detail_cache.get_or_build(1, self.slow_build), {"built": 2})
+
+
+class ProductSearchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.watch = Product.objects.create(
+            name="Apple Watch",
+            description="Smart watch with heart rate sensor",
+            price=399,
+        )
+        self.strap = Product.objects.create(
+            name="Leather strap", description="Fits every apple watch", price=49
+        )
+        Product.objects.create(name="Office chair", description="Ergonomic", price=150)
+
+    def search(self, query):
+        return self.client.get("/api/products/search/", {"q": query})
+
+    def test_ranks_name_matches_first_and_highlights(self):
+        response = self.search("apple watch")
+        ids = [item["id"] for item in response.data["results"]]
+        self.assertEqual(ids, [self.watch.id, self.strap.id])
+        self.assertEqual(
+            response.data["results"][0]["name_highlight"],
+            "<mark>Apple</mark> <mark>Watch</mark>",
+        )
+        self.assertIn("<mark>apple</mark>", response.data["results"][1]["snippet"])
+
+    def test_highlights_escape_product_text(self):
+        Product.objects.create(
+            name="<img src=x onerror=alert(1)> Lamp",
+            description="A <script>lamp</script> & more",
+            price=20,
+        )
+        result = self.search("lamp").data["results"][0]
+        self.assertEqual(
+            result["name_highlight"],
+            "&lt;img src=x onerror=alert(1)&gt; <mark>Lamp</mark>",
+        )
+        self.assertEqual(
+            result["snippet"],
+            "A &lt;script&gt;<mark>lamp</mark>&lt;/script&gt; &amp; more",
+        )
+
+    def test_prefix_match_and_index_follows_writes(self):
+        self.assertEqual(len(self.search("ergo").data["results"]), 1)
+
+        Product.objects.filter(pk=self.strap.pk).update(name="Nylon band")
+        self.watch.delete()
+        names = [item["name"] for item in self.search("nylon").data["results"]]
+        self.assertEqual(names, ["Nylon band"])
+        self.assertEqual(self.search("heart").data["results"], [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"apple AND (').status_code, 200)
+        self.assertEqual(self.search("").status_code, 400)
+
+    def test_rebuild_command(self):
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self.search("chair").data["results"]), 1)
+
+
+class ProductSuggestTest(TestCase):
+
+    def setUp(self):
+        self.watch = Product.objects.create(name="Apple Watch", price=399)
+        self.strap = Product.objects.create(
+            name="Watch Strap", price=49, average_rating=4.5, total_ratings=10
+        )
+        Product.objects.create(name="Office Chair", price=150)
+        suggest_index.rebuild()
+
+    def suggest(self, prefix):
+        response = self.client.get("/api/products/suggest/", {"prefix": prefix})
+        return [item["name"] for item in response.data["results"]]
+
+    def test_matches_any_word_ranked_by_rating(self):
+        self.assertEqual(self.suggest("wat"), ["Watch Strap", "Apple Watch"])
+        self.assertEqual(self.suggest("apple w"), ["Apple Watch"])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_index_follows_product_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.watch.name = "Smart Band"
+            self.watch.save()
+        self.assertEqual(self.suggest("smart"), ["Smart Band"])
+        self.assertEqual(self.suggest("apple"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.watch.delete()
+        self.assertEqual(self.suggest("smart"), [])
+        self.assertGreater(suggest_index.get_stats()["memory_bytes"], 0)
+
+    def test_one_thread_rebuilds_while_others_serve_the_old_index(self):
+        index = PrefixIndex()
+        builds = []
+
+        def slow_rebuild():
+            builds.append(threading.current_thread())
+            time.sleep(0.2)
+            with index._lock:
+                index._keys, index._products = [("lamp", 1)], {1: ("Lamp", 0, 0)}
+                index._built_at = time.monotonic()
+
+        index.rebuild = slow_rebuild
+
+        def type_keystrokes():
+            results, started = [], time.monotonic()
+
+            def keystroke():
+                answer = index.suggest("la", 5)
+                results.append((answer, time.monotonic() - started))
+
+            threads = [threading.Thread(target=keystroke) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return results
+
+        # nothing built yet: everyone waits for a single build
+        results = type_keystrokes()
+        self.assertEqual(len(builds), 1)
+        self.assertTrue(all(answer for answer, _ in results))
+
+        # expired: one rebuilds, the rest answer from the old index at once
+        index._built_at -= settings.SUGGEST_INDEX_MAX_AGE + 1
+        results = type_keystrokes()
+        self.assertEqual(len(builds), 2)
+        self.assertTrue(all(answer for answer, _ in results))
+        self.assertEqual(sum(elapsed < 0.1 for _, elapsed in results), 7)
+
+
+class ProductFacetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cheap = Product.objects.create(name="Cable", price=10, stock=True)
+        self.mid = Product.objects.create(name="Keyboard", price=80, stock=False)
+        self.pricey = Product.objects.create(name="Monitor", price=300, stock=True)
+        user = User.objects.create_user(username="dave", password="dave1234")
+        Rating.objects.create(user=user, product=self.pricey, rating=4)
+
+    def listing(self, **params):
+        response = self.client.get("/api/products/", {"facets": "true", **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_filters(self):
+        data = self.listing(min_price=20, in_stock="true")
+        self.assertEqual([item["name"] for item in data["results"]], ["Monitor"])
+        data = self.listing(min_rating=3.5)
+        self.assertEqual([item["name"] for item in data["results"]], ["Monitor"])
+        response = self.client.get("/api/products/?min_price=abc")
+        self.assertEqual(response.status_code, 400)
+        for value in ("nan", "Infinity", "-inf", "snan"):
+            response = self.client.get("/api/products/", {"min_rating": value})
+            self.assertEqual(response.status_code, 400)
+
+    def test_facet_counts_follow_writes_and_other_filters(self):
+        facets = self.listing()["facets"]
+        self.assertEqual(facets["stock"], {"in_stock": 2, "out_of_stock": 1})
+        self.assertEqual(facets["rating"][4], {"min_rating": 4, "count": 1})
+
+        self.mid.stock = True
+        self.mid.save()
+        self.cheap.delete()
+        facets = self.listing(in_stock="true")["facets"]
+        prices = {bucket["min"]: bucket["count"] for bucket in facets["price"]}
+        self.assertEqual((prices[0], prices[50], prices[250]), (0, 1, 1))
+        # the stock facet ignores the stock filter itself
+        self.assertEqual(facets["stock"], {"in_stock": 2, "out_of_stock": 0})
+
+    def test_rebuild_matches_incremental_counts(self):
+        before = sorted(
+            ProductFacetCount.objects.filter(count__gt=0).values_list(
+                "price_bucket", "rating_bucket", "in_stock", "count"
+            )
+        )
+        call_command("rebuild_facets", stdout=StringIO())
+        after = sorted(
+            ProductFacetCount.objects.values_list(
+                "price_bucket", "rating_bucket", "in_stock", "count"
+            )
+        )
+        self.assertEqual(before, after)
+
+
+class ProductImportTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@gmail.com", password="admin1234"
+        )
+        Product.objects.create(sku="SKU-1", name="Old name", price=5, stock=False)
+
+    def upload(self, name, content):
+        self.client.force_authenticate(self.admin_user)
+        upload = SimpleUploadedFile(name, content.encode("utf-8"))
+        return self.client.post("/api/product-import/", {"file": upload})
+
+    def test_csv_upsert_with_error_report(self):
+        response = self.upload(
+            "feed.csv",
+            "sku,name,description,price,quantity\n"
+            "SKU-1,New name,updated,7.50,4\n"
+            "SKU-2,Fresh,,12,0\n"
+            "SKU-3,Broken,,not-a-price,2\n",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 4)
+        self.assertIn("price", response.data["errors"][0]["errors"])
+
+        updated = Product.objects.get(sku="SKU-1")
+        self.assertEqual(updated.name, "New name")
+        self.assertEqual(str(updated.price), "7.50")
+        self.assertTrue(updated.stock)
+        self.assertEqual(updated.quantity, 4)
+        self.assertFalse(Product.objects.get(sku="SKU-2").stock)
+
+        # imported stock can be reserved
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.post(
+            f"/api/product/{updated.id}/reserve/", {"quantity": 4}
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_partial_rows_leave_other_columns_alone(self):
+        Product.objects.filter(sku="SKU-1").update(
+            description="Nice chair", quantity=7, stock=True
+        )
+        response = self.upload(
+            "feed.csv", "sku,name,price\nSKU-1,Chair v2,12\nSKU-2,Stool,3\n"
+        )
+        self.assertEqual(response.data["updated"], 1)
+
+        updated = Product.objects.get(sku="SKU-1")
+        self.assertEqual(updated.name, "Chair v2")
+        self.assertEqual(str(updated.price), "12.00")
+        self.assertEqual(updated.description, "Nice chair")
+        self.assertEqual(updated.quantity, 7)
+        self.assertTrue(updated.stock)
+
+        created = Product.objects.get(sku="SKU-2")
+        self.assertEqual((created.description, created.quantity), ("", 0))
+        self.assertFalse(created.stock)
+
+    def test_jsonl_import_in_small_batches(self):
+        lines = [
+            json.dumps({"sku": f"J-{i}", "name": f"Item {i}", "price": "1.00"})
+            for i in range(5)
+        ]
+        with self.settings(IMPORT_BATCH_SIZE=2):
+            response = self.upload("feed.jsonl", "\n".join(lines + ["{oops"]))
+        self.assertEqual(response.data["created"], 5)
+        self.assertEqual(response.data["error_count"], 1)
+        # bulk writes skip signals, the import refreshes facet counts itself
+        facets = self.client.get("/api/products/?facets=true").data["facets"]
+        self.assertEqual(facets["stock"]["out_of_stock"], 6)
+
+    def test_undecodable_file_stops_with_partial_report(self):
+        # enough UTF-8 rows to fill the first read, then a Latin-1 one
+        rows = "".join(f"P-{i},Item {i},,1.00,1\n" for i in range(400))
+        content = f"sku,name,description,price,quantity\n{rows}".encode("utf-8")
+        content += "P-X,Caf\u00e9,,1.00,1\n".encode("latin-1")
+        self.client.force_authenticate(self.admin_user)
+        with self.settings(IMPORT_BATCH_SIZE=100):
+            response = self.client.post(
+                "/api/product-import/",
+                {"file": SimpleUploadedFile("feed.csv", content)},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["error_count"], 1)
+        error = response.data["errors"][0]
+        self.assertIn("import stopped", error["errors"])
+        self.assertGreater(response.data["created"], 0)
+        self.assertEqual(
+            Product.objects.filter(sku__startswith="P-").count(),
+            response.data["created"],
+        )
+        self.assertEqual(error["line"], response.data["created"] + 2)
+
+        # longer than csv.field_size_limit()
+        oversized = "x" * (csv.field_size_limit() + 1)
+        response = self.upload("feed.csv", f"sku,name,price\nP-1,{oversized},1\n")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["errors"][0]["line"], 2)
+        self.assertIn("Invalid CSV", response.data["errors"][0]["errors"])
+
+    def test_import_requires_admin(self):
+        response = self.client.post("/api/product-import/", {})
+        self.assertEqual(response.status_code, 401)
+
+
+class ExportTest(APITestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@gmail.com", password="admin1234"
+        )
+        self.client.force_authenticate(self.admin_user)
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_product_csv_streams_in_chunks(self):
+        for i in range(5):
+            Product.objects.create(sku=f"E-{i}", name=f"Item, {i}", price=i + 1)
+
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            response = self.client.get("/api/products/export/?min_price=2")
+            self.assertTrue(response.streaming)
+            self.assertIn("attachment;", response["Content-Disposition"])
+            # header, then rows in pieces of at most two
+            pieces = list(response.streaming_content)
+        self.assertEqual(len(pieces), 3)
+
+        rows = list(csv.DictReader(StringIO(b"".join(pieces).decode("utf-8"))))
+        self.assertEqual([row["sku"] for row in rows], ["E-1", "E-2", "E-3", "E-4"])
+        self.assertEqual(rows[0]["name"], "Item, 1")
+
+    def test_non_finite_filters_are_rejected(self):
+        # the export shares the listing's filter parser
+        for value in ("nan", "Infinity"):
+            response = self.client.get("/api/products/export/", {"min_price": value})
+            self.assertEqual(response.status_code, 400)
+
+    def test_order_jsonl_filters_by_status_and_date(self):
+        paid_at = datetime.datetime(2024, 3, 10, 12, tzinfo=datetime.timezone.utc)
+        OrderModel.objects.create(name="a", paid_status=True, paid_at=paid_at)
+        OrderModel.objects.create(
+            name="b", paid_status=True, paid_at=paid_at, is_delivered=True
+        )
+        OrderModel.objects.create(
+            name="c", paid_status=True, paid_at=paid_at + datetime.timedelta(days=30)
+        )
+        OrderModel.objects.create(name="d")
+
+        body = self.download(
+            "/account/orders/export/?output=jsonl&paid=true&delivered=false"
+            "&date_from=2024-03-01&date_to=2024-03-10"
+        )
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["name"] for row in rows], ["a"])
+        self.assertNotIn("card_number", rows[0])
+
+    def test_report_export_filters_by_status(self):
+        Report.objects.create(
+            user=self.admin_user, report_type="OTHER", title="Open", description="x"
+        )
+        Report.objects.create(
+            user=self.admin_user,
+            report_type="OTHER",
+            title="Done",
+            description="y",
+            status="RESOLVED",
+        )
+        rows = list(
+            csv.DictReader(StringIO(self.download("/api/reports/export/?status=pending")))
+        )
+        self.assertEqual([row["title"] for row in rows], ["Open"])
+
+    def test_csv_cells_never_start_a_formula(self):
+        Report.objects.create(
+            user=self.admin_user,
+            report_type="OTHER",
+            title='=HYPERLINK("http://example.com","click")',
+            description="@SUM(A1:A9)",
+        )
+        OrderModel.objects.create(name="+1-555", address="-2+3")
+
+        report = next(csv.DictReader(StringIO(self.download("/api/reports/export/"))))
+        self.assertEqual(report["title"], '\'=HYPERLINK("http://example.com","click")')
+        self.assertEqual(report["description"], "'@SUM(A1:A9)")
+        order = next(
+            csv.DictReader(StringIO(self.download("/account/orders/export/")))
+        )
+        self.assertEqual((order["name"], order["address"]), ("'+1-555", "'-2+3"))
+
+        # JSON Lines keeps the values as they are
+        body = self.download("/api/reports/export/?output=jsonl")
+        self.assertEqual(json.loads(body)["description"], "@SUM(A1:A9)")
+
+    def test_rejects_bad_parameters_and_non_admins(self):
+        self.assertEqual(
+            self.client.get("/api/products/export/?output=xml").status_code, 400
+        )
+        self.assertEqual(
+            self.client.get("/account/orders/export/?date_from=soon").status_code, 400
+        )
+        self.assertEqual(
+            self.client.get("/account/orders/export/?paid=maybe").status_code, 400
+        )
+
+        user = User.objects.create_user(username="shopper", password="pass1234")
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get("/account/orders/export/").status_code, 403)
+        self.assertEqual(self.client.get("/api/reports/export/").status_code, 403)
+
+
+class ImageVariantTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = self.settings(MEDIA_ROOT=self.media_root, IMAGE_VARIANT_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@gmail.com", password="admin1234"
+        )
+
+    def png(self, name="photo.png", size=(1200, 600)):
+        buffer = BytesIO()
+        Image.new("RGBA", size, (255, 0, 0, 128)).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def test_upload_renders_variants_after_commit(self):
+        self.client.force_authenticate(self.admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/product-create/",
+                {
+                    "name": "Poster",
+                    "description": "",
+                    "price": "9.99",
+                    "stock": "true",
+                    "image": self.png(),
+                },
+            )
+        self.assertEqual(response.status_code, 200)
+        # the response does not wait for the variants
+        self.assertEqual(response.data["image_variants"], {})
+
+        product = Product.objects.get(name="Poster")
+        self.assertEqual(set(product.image_variants), {"thumbnail", "card", "large"})
+        with Image.open(
+            os.path.join(self.media_root, product.image_variants["card"]["webp"])
+        ) as card:
+            self.assertEqual(card.size, (400, 200))
+        with Image.open(
+            os.path.join(self.media_root, product.image_variants["thumbnail"]["jpeg"])
+        ) as thumbnail:
+            self.assertEqual(thumbnail.format, "JPEG")
+
+        detail = self.client.get(f"/api/product/{product.id}/")
+        self.assertTrue(
+            detail.data["image_variants"]["large"]["webp"].endswith("-large.webp")
+        )
+
+    def test_backfill_command_skips_rendered_and_reports_broken(self):
+        with open(os.path.join(self.media_root, "kept.png"), "wb") as f:
+            f.write(self.png().read())
+        with open(os.path.join(self.media_root, "broken.png"), "wb") as f:
+            f.write(b"not an image")
+        good = Product.objects.create(name="Good", price=1, image="kept.png")
+        Product.objects.create(name="Broken", price=1, image="broken.png")
+        Product.objects.create(name="No image", price=1)
+
+        out, err = StringIO(), StringIO()
+        call_command("generate_image_variants", "--workers=0", stdout=out, stderr=err)
+        self.assertIn("1 products, 1 failed", out.getvalue())
+        self.assertIn("broken.png", err.getvalue())
+        good.refresh_from_db()
+        self.assertIn("webp", good.image_variants["thumbnail"])
+
+        out = StringIO()
+        call_command("generate_image_variants", "--workers=0", stdout=out, stderr=err)
+        self.assertIn("0 products, 1 failed", out.getvalue())
+
+    def test_variants_of_a_replaced_image_are_discarded(self):
+        product = Product.objects.create(name="Swap", price=1, image="new.png")
+        saved = save_variants(product.id, "old.png", {"card": {"webp": "x.webp"}})
+        self.assertFalse(saved)
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+
+class BlobStorageTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = self.settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, name, content):
+        return SimpleUploadedFile(name, content)
+
+    def blob(self, name):
+        return StoredBlob.objects.get(name=name)
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        first = Product.objects.create(
+            name="A", price=1, image=self.upload("a.jpg", b"same bytes")
+        )
+        second = Product.objects.create(
+            name="B", price=1, image=self.upload("copy.JPG", b"same bytes")
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith("blobs/"))
+        self.assertTrue(first.image.name.endswith(".jpg"))
+        self.assertEqual(StoredBlob.objects.count(), 1)
+        self.assertEqual(self.blob(first.image.name).ref_count, 2)
+
+        user = User.objects.create_user(username="reporter", password="pass1234")
+        Report.objects.create(
+            user=user,
+            report_type="OTHER",
+            title="Photo",
+            description="x",
+            evidence=self.upload("proof.jpg", b"same bytes"),
+        )
+        self.assertEqual(self.blob(first.image.name).ref_count, 3)
+
+    def test_references_follow_replacements_and_deletes(self):
+        product = Product.objects.create(
+            name="A", price=1, image=self.upload("a.jpg", b"old")
+        )
+        old_name = product.image.name
+        product.image = self.upload("b.jpg", b"new")
+        product.save()
+        self.assertEqual(self.blob(old_name).ref_count, 0)
+        self.assertEqual(self.blob(product.image.name).ref_count, 1)
+
+        # a stale instance saving an unchanged image does not recount it
+        stale = Product.objects.get(pk=product.pk)
+        stale.name = "Renamed"
+        stale.save()
+        self.assertEqual(self.blob(product.image.name).ref_count, 1)
+
+        new_name = product.image.name
+        product.delete()
+        self.assertEqual(self.blob(new_name).ref_count, 0)
+
+    def test_collect_blobs_keeps_referenced_and_recent_files(self):
+        kept = Product.objects.create(
+            name="A", price=1, image=self.upload("a.jpg", b"kept")
+        )
+        dropped = Product.objects.create(
+            name="B", price=1, image=self.upload("b.jpg", b"dropped")
+        )
+        dropped_name = dropped.image.name
+        dropped.delete()
+
+        out = StringIO()
+        call_command("collect_blobs", stdout=out)
+        self.assertIn("Deleted 0", out.getvalue())
+
+        call_command("collect_blobs", "--grace-seconds=0", stdout=out)
+        self.assertIn("Deleted 1 unused blobs, freed 7 bytes", out.getvalue())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, dropped_name)))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, kept.image.name)))
+        self.assertFalse(StoredBlob.objects.filter(name=dropped_name).exists())
+
+
+class MediaServingTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = self.settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        os.makedirs(os.path.join(self.media_root, "blobs", "ab"))
+        for name in ("photo.jpg", "blobs/ab/abc.jpg"):
+            with open(os.path.join(self.media_root, name), "wb") as f:
+                f.write(b"0123456789")
+
+    def test_full_response_with_validators_and_cache_headers(self):
+        response = self.client.get("/images/photo.jpg")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("max-age=3600", response["Cache-Control"])
+        self.assertNotIn("immutable", response["Cache-Control"])
+
+        blob = self.client.get("/images/blobs/ab/abc.jpg")
+        self.assertIn("immutable", blob["Cache-Control"])
+
+        etag = self.client.get(
+            "/images/photo.jpg", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(etag.status_code, 304)
+        since = self.client.get(
+            "/images/photo.jpg", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(since.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get("/images/photo.jpg", HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+
+        suffix = self.client.get("/images/photo.jpg", HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(suffix.streaming_content), b"789")
+
+        past_end = self.client.get("/images/photo.jpg", HTTP_RANGE="bytes=10-")
+        self.assertEqual(past_end.status_code, 416)
+        self.assertEqual(past_end["Content-Range"], "bytes */10")
+
+        # a stale If-Range gets the whole, current file
+        stale = self.client.get(
+            "/images/photo.jpg", HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(stale.status_code, 200)
+
+    def test_sendfile_offload_and_path_checks(self):
+        with self.settings(MEDIA_SENDFILE="x-accel-redirect"):
+            response = self.client.get("/images/photo.jpg")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/photo.jpg")
+        self.assertEqual(response.content, b"")
+
+        with self.settings(MEDIA_SENDFILE="x-sendfile"):
+            response = self.client.get("/images/photo.jpg")
+        self.assertEqual(
+            response["X-Sendfile"], os.path.join(self.media_root, "photo.jpg")
+        )
+
+        self.assertEqual(self.client.get("/images/../settings.py").status_code, 404)
+        self.assertEqual(self.client.get("/images/blobs").status_code, 404)
+        self.assertEqual(self.client.post("/images/photo.jpg").status_code, 405)
+
+
+class InventoryTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="buyer", password="pass1234")
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@gmail.com", password="admin1234"
+        )
+        self.product = Product.objects.create(
+            name="Hot item", price=10, stock=True, quantity=3
+        )
+
+    def in_stock_count(self):
+        return sum(
+            ProductFacetCount.objects.filter(in_stock=True).values_list(
+                "count", flat=True
+            )
+        )
+
+    def reserve(self, quantity):
+        self.client.force_authenticate(self.user)
+        return self.client.post(
+            f"/api/product/{self.product.id}/reserve/", {"quantity": quantity}
+        )
+
+    def test_conditional_decrements_never_oversell(self):
+        self.assertTrue(take_stock(self.product.id, 2))
+        self.assertFalse(take_stock(self.product.id, 2))
+        self.assertTrue(take_stock(self.product.id, 1))
+        self.assertFalse(take_stock(self.product.id, 1))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 0)
+        self.assertFalse(self.product.stock)
+        self.assertEqual(self.in_stock_count(), 0)
+
+        put_back_stock(self.product.id, 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 2)
+        self.assertTrue(self.product.stock)
+        self.assertEqual(self.in_stock_count(), 1)
+
+    def test_reserve_confirm_and_release(self):
+        response = self.reserve(2)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.reserve(2).status_code, 409)
+        self.assertEqual(self.reserve(0).status_code, 400)
+
+        confirm = self.client.post(f"/api/reservations/{response.data['id']}/confirm/")
+        self.assertEqual(confirm.status_code, 200)
+        self.assertFalse(StockReservation.objects.exists())
+
+        held = self.reserve(1)
+        self.assertEqual(
+            self.client.delete(f"/api/reservations/{held.data['id']}/").status_code, 204
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 1)
+
+        # other users cannot touch someone else's reservation
+        held = self.reserve(1)
+        other = User.objects.create_user(username="other", password="pass1234")
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.delete(f"/api/reservations/{held.data['id']}/").status_code, 404
+        )
+
+    def test_expired_reservations_return_to_stock(self):
+        with self.settings(STOCK_RESERVATION_TTL=-1):
+            expired = self.reserve(3)
+        self.assertEqual(expired.status_code, 201)
+
+        # the failed attempt sweeps the expired hold and then succeeds
+        self.assertEqual(self.reserve(2).status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 1)
+
+        confirm = self.client.post(f"/api/reservations/{expired.data['id']}/confirm/")
+        self.assertEqual(confirm.status_code, 404)
+
+        with self.settings(STOCK_RESERVATION_TTL=-1):
+            late = self.reserve(1)
+        confirm = self.client.post(f"/api/reservations/{late.data['id']}/confirm/")
+        self.assertEqual(confirm.status_code, 409)
+        out = StringIO()
+        call_command("release_expired_reservations", stdout=out)
+        self.assertIn("Released 1", out.getvalue())
+
+    def test_created_and_edited_products_follow_their_quantity(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = self.settings(MEDIA_ROOT=media_root, IMAGE_VARIANT_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        buffer = BytesIO()
+        Image.new("RGB", (8, 8)).save(buffer, "PNG")
+
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.post(
+            "/api/product-create/",
+            {
+                "name": "Lamp",
+                "description": "Desk lamp",
+                "price": "20.00",
+                "quantity": 2,
+                "image": SimpleUploadedFile("lamp.png", buffer.getvalue()),
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["stock"])
+        lamp = Product.objects.get(pk=response.data["id"])
+        self.assertEqual(lamp.quantity, 2)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(f"/api/product/{lamp.id}/reserve/", {"quantity": 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Product.objects.get(pk=lamp.id).stock)
+
+        # a stock flag on its own no longer changes anything
+        self.client.force_authenticate(self.admin_user)
+        edit = {"name": "", "description": "", "price": "", "image": ""}
+        self.client.put(
+            f"/api/product-update/{lamp.id}/", {**edit, "stock": True}, format="json"
+        )
+        self.assertFalse(Product.objects.get(pk=lamp.id).stock)
+        self.client.put(
+            f"/api/product-update/{lamp.id}/", {**edit, "quantity": 5}, format="json"
+        )
+        lamp.refresh_from_db()
+        self.assertEqual((lamp.quantity, lamp.stock), (5, True))
+
+        # the Django admin is a writer too
+        lamp.quantity, lamp.stock = 0, True
+        ProductAdmin(Product, admin.site).save_model(None, lamp, None, True)
+        lamp.refresh_from_db()
+        self.assertEqual((lamp.quantity, lamp.stock), (0, False))
+
+    def test_admin_sets_quantity(self):
+        self.client.force_authenticate(self.admin_user)
+        url = f"/api/product/{self.product.id}/inventory/"
+        response = self.client.put(url, {"quantity": 0})
+        self.assertEqual(response.data, {"quantity": 0, "reserved": 0})
+        self.assertEqual(self.in_stock_count(), 0)
+        self.assertEqual(self.client.put(url, {"quantity": -1}).status_code, 400)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ViewCounterTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        view_counter.flush()
+        self.product = Product.objects.create(name="Popular", price=5)
+
+    def views(self):
+        counts = ProductViewCount.objects.filter(product=self.product)
+        return counts.values_list("views", flat=True).first()
+
+    def test_detail_hits_are_buffered_until_flushed(self):
+        url = f"/api/product/{self.product.id}/"
+        first = self.client.get(url)
+        self.client.get(url)  # served from the catalog cache
+        self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertIsNone(self.views())
+
+        self.assertEqual(view_counter.flush(), 3)
+        self.assertEqual(self.views(), 3)
+        self.assertEqual(view_counter.get_stats()["pending_hits"], 0)
+
+    def test_flush_on_size_and_additive_across_processes(self):
+        with self.settings(VIEW_COUNTER_FLUSH_SIZE=3):
+            worker_a, worker_b = (
+                BufferedCounter(write_view_counts),
+                BufferedCounter(write_view_counts),
+            )
+            worker_a.record(self.product.id)
+            worker_b.record(self.product.id, hits=2)
+            worker_a.record(self.product.id)
+            self.assertIsNone(self.views())
+            worker_a.record(self.product.id)
+            self.assertEqual(self.views(), 3)
+            worker_b.flush()
+            self.assertEqual(self.views(), 5)
+
+    def test_deleted_products_and_forked_buffers_are_dropped(self):
+        counter = BufferedCounter(write_view_counts)
+        counter.record(self.product.id)
+        counter.record(123456)
+        # a forked child starts with an empty buffer
+        counter._pid = -1
+        counter.record(self.product.id)
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(self.views(), 1)
+
+
+class LeaderboardTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(username=f"fan{i}", password="pass1234")
+            for i in range(4)
+        ]
+        self.single = Product.objects.create(name="One review", price=1)
+        self.steady = Product.objects.create(name="Many reviews", price=1)
+        self.unrated = Product.objects.create(name="Unrated", price=1)
+
+    def rate(self, product, user, stars):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Rating.objects.create(product=product, user=user, rating=stars)
+
+    def test_boards_follow_rating_writes(self):
+        self.rate(self.single, self.users[0], 5)
+        for user in self.users:
+            self.rate(self.steady, user, 4)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/products/top/")
+        names = [product["name"] for product in response.data["results"]]
+        # the prior keeps a lone 5-star review below four 4-star ones
+        self.assertEqual(names, ["Many reviews", "One review"])
+        self.assertNotIn("ratings", response.data["results"][0])
+
+        trending = self.client.get("/api/products/top/?board=trending&limit=1")
+        self.assertEqual(trending.data["results"][0]["name"], "Many reviews")
+        self.assertEqual(trending.data["results"][0]["score"], 4)
+
+        rating = Rating.objects.get(product=self.single)
+        with self.captureOnCommitCallbacks(execute=True):
+            rating.delete()
+        self.assertFalse(ProductScore.objects.filter(product=self.single).exists())
+        response = self.client.get("/api/products/top/")
+        self.assertEqual(len(response.data["results"]), 1)
+
+        self.assertEqual(self.client.get("/api/products/top/?board=x").status_code, 400)
+
+    def test_scheduled_refresh_ages_out_trending_ratings(self):
+        rating = self.rate(self.steady, self.users[0], 4)
+        self.rate(self.single, self.users[1], 3)
+        past = rating.created_at - datetime.timedelta(days=8)
+        Rating.objects.filter(pk=rating.pk).update(created_at=past)
+        # pretend the week has passed for the stored expiry as well
+        ProductScore.objects.filter(product=self.steady).update(trending_expires_at=past)
+
+        out = StringIO()
+        call_command("refresh_leaderboards", stdout=out)
+        self.assertIn("Refreshed 1 products", out.getvalue())
+        score = ProductScore.objects.get(product=self.steady)
+        self.assertEqual(score.trending, 0)
+        self.assertIsNone(score.trending_expires_at)
+
+        response = self.client.get("/api/products/top/?board=trending")
+        self.assertEqual(
+            [product["name"] for product in response.data["results"]], ["One review"]
+        )
+
+    def test_full_rebuild(self):
+        Rating.objects.bulk_create(
+            [Rating(product=self.steady, user=user, rating=5) for user in self.users]
+        )
+        # bulk writes skip the signals; repairing the aggregates refreshes
+        # the scores of the products it touched
+        call_command("recompute_ratings", stdout=StringIO())
+        score = ProductScore.objects.get(product=self.steady)
+        self.assertEqual(score.trending, 4)
+        self.assertAlmostEqual(score.top_rated, (20 + 3.0 * 5) / 9)
+
+        ProductScore.objects.all().delete()
+        call_command("refresh_leaderboards", "--all", stdout=StringIO())
+        self.assertEqual(ProductScore.objects.get(product=self.steady).trending, 4)
+
+
+class SimilarProductsTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.desk, self.chair, self.lamp, self.mug = (
+            Product.objects.create(name=name, price=10)
+            for name in ("Desk", "Chair", "Lamp", "Mug")
+        )
+
+    def buy(self, username, *items, paid=True):
+        user, _ = User.objects.get_or_create(username=username)
+        for item in items:
+            OrderModel.objects.create(
+                name=username, ordered_item=item, paid_status=paid, user=user
+            )
+
+    def test_co_purchases_ranked_and_served_on_detail(self):
+        self.buy("ann", "Desk", "Chair", "Lamp")
+        self.buy("bob", "desk ", "Chair")
+        self.buy("cid", "Desk", "Mug", "Unknown item")
+        self.buy("dan", "Mug", "Lamp", paid=False)
+        self.buy("eve", "Chair")
+
+        # shards only change how much is held in memory, not the result
+        for shards in (1, 3):
+            call_command(
+                "build_similar_products",
+                "--min-support=1",
+                "--top-k=2",
+                f"--shards={shards}",
+                stdout=StringIO(),
+            )
+            neighbours = SimilarProduct.objects.filter(product=self.desk)
+            self.assertEqual(
+                list(neighbours.order_by("rank").values_list("similar", flat=True)),
+                [self.chair.id, self.mug.id],
+            )
+            self.assertEqual(
+                SimilarProduct.objects.filter(similar=self.desk).count(), 3
+            )
+
+        response = self.client.get(f"/api/product/{self.desk.id}/")
+        self.assertEqual(
+            [product["name"] for product in response.data["similar"]], ["Chair", "Mug"]
+        )
+        self.assertNotIn("ratings", response.data["similar"][0])
+
+        response = self.client.get(f"/api/product/{self.desk.id}/?fields=id,name")
+        self.assertNotIn("similar", response.data)
+
+    def test_min_support_drops_one_off_pairs(self):
+        self.buy("ann", "Desk", "Chair")
+        self.buy("bob", "Desk", "Chair", "Lamp")
+        call_command("build_similar_products", "--min-support=2", stdout=StringIO())
+        self.assertEqual(
+            set(SimilarProduct.objects.values_list("product", "similar")),
+            {(self.desk.id, self.chair.id), (self.chair.id, self.desk.id)},
+        )
+
+
+class ProductChangeFeedTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@gmail.com", password="admin1234"
+        )
+        self.desk = Product.objects.create(name="Desk", price=100, quantity=5)
+        self.chair = Product.objects.create(name="Chair", price=40)
+        self.lamp = Product.objects.create(name="Lamp", price=20)
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params["since"] = since
+        return self.client.get("/api/products/changes/", params)
+
+    def test_full_download_then_only_changes(self):
+        response = self.changes()
+        self.assertEqual(
+            [product["name"] for product in response.data["changed"]],
+            ["Desk", "Chair", "Lamp"],
+        )
+        self.assertNotIn("ratings", response.data["changed"][0])
+        self.assertFalse(response.data["more"])
+        token = response.data["token"]
+
+        response = self.changes(token)
+        self.assertEqual(response.data["changed"], [])
+        self.assertEqual(response.data["token"], token)
+
+        self.desk.price = 90
+        self.desk.save()
+        self.client.force_authenticate(self.admin_user)
+        self.client.delete(f"/api/product-delete/{self.chair.id}/")
+        # stock counts alone are not part of the synced payload
+        take_stock(self.lamp.id, 0)
+        take_stock(self.desk.id, 1)
+
+        response = self.changes(token)
+        self.assertEqual(
+            [product["id"] for product in response.data["changed"]], [self.desk.id]
+        )
+        self.assertEqual(response.data["changed"][0]["price"], "90.00")
+        self.assertEqual(response.data["deleted"], [self.chair.id])
+        self.assertEqual(self.changes(response.data["token"]).data["changed"], [])
+
+    def test_queryset_writes_are_tracked(self):
+        token = self.changes().data["token"]
+        before = Product.objects.get(pk=self.lamp.pk).updated_at
+        Product.objects.filter(pk=self.lamp.pk).update(name="Desk lamp")
+        Product.objects.filter(pk=self.desk.pk).delete()
+        cache.clear()  # queryset writes send no signals
+
+        response = self.changes(token)
+        self.assertEqual(
+            [product["name"] for product in response.data["changed"]], ["Desk lamp"]
+        )
+        self.assertEqual(response.data["deleted"], [self.desk.id])
+        self.assertGreater(Product.objects.get(pk=self.lamp.pk).updated_at, before)
+
+    def test_changes_are_paged_in_order(self):
+        token = self.changes().data["token"]
+        chair_id = self.chair.id
+        self.lamp.save()
+        self.chair.delete()
+        self.desk.save()
+
+        seen = []
+        more = True
+        while more:
+            response = self.changes(token, limit=1)
+            seen += [("changed", item["id"]) for item in response.data["changed"]]
+            seen += [("deleted", item) for item in response.data["deleted"]]
+            token, more = response.data["token"], response.data["more"]
+        self.assertEqual(
+            seen,
+            [
+                ("changed", self.lamp.id),
+                ("deleted", chair_id),
+                ("changed", self.desk.id),
+            ],
+        )
+
+    def test_unknown_and_purged_tokens_must_resync(self):
+        token = self.changes().data["token"]
+        self.assertEqual(self.changes("soon").status_code, 400)
+        self.assertEqual(self.changes(int(token) + 1).status_code, 410)
+
+        self.chair.delete()
+        ProductTombstone.objects.update(
+            deleted_at=timezone.now() - datetime.timedelta(days=365)
+        )
+        out = StringIO()
+        call_command("purge_product_tombstones", stdout=out)
+        self.assertIn("Purged 1 tombstones", out.getvalue())
+        cache.clear()
+
+        self.assertEqual(self.changes(token).status_code, 410)
+        response = self.changes()
+        self.assertEqual(len(response.data["changed"]), 2)
+        self.assertEqual(self.changes(response.data["token"]).status_code, 200)
+
+
+class RatingSubmissionTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        rating_aggregates.flush()
+        # flushes only when a test asks for one
+        self.enterContext(self.settings(RATING_AGGREGATE_FLUSH_INTERVAL=3600))
+        self.product = Product.objects.create(name="Lamp", price=40, stock=True)
+        self.users = [
+            User.objects.create_user(username=f"reviewer{i}", password="pass1234")
+            for i in range(3)
+        ]
+
+    def rate(self, user, stars, comment=""):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f"/api/product/{self.product.id}/ratings/",
+                {"rating": stars, "comment": comment},
+            )
+
+    def test_ratings_listed_at_once_and_aggregates_written_behind(self):
+        for user, stars in zip(self.users, [5, 4, 2]):
+            response = self.rate(user, stars)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data["user"], user.id)
+
+        response = self.client.get(f"/api/product/{self.product.id}/ratings/")
+        self.assertEqual(len(response.data["results"]), 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_ratings, 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rating_aggregates.flush(), 3)
+        product_updates = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "product_product"')
+        ]
+        self.assertEqual(len(product_updates), 1)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_ratings, 3)
+        self.assertEqual(str(self.product.average_rating), "3.67")
+        self.assertEqual(self.product.rating_histogram, {5: 1, 4: 1, 3: 0, 2: 1, 1: 0})
+        self.assertTrue(ProductScore.objects.filter(product=self.product).exists())
+        response = self.client.get(f"/api/product/{self.product.id}/")
+        self.assertEqual(response.data["total_ratings"], 3)
+
+    def test_rating_again_replaces_the_rating(self):
+        self.assertEqual(self.rate(self.users[0], 1).status_code, 201)
+        response = self.rate(self.users[0], 4, "Grew on me")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["comment"], "Grew on me")
+        rating_aggregates.flush()
+
+        self.assertEqual(Rating.objects.filter(product=self.product).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_ratings, 1)
+        self.assertEqual(self.product.rating_histogram, {5: 0, 4: 1, 3: 0, 2: 0, 1: 0})
+
+    def test_flushes_inline_when_the_buffer_is_full(self):
+        with self.settings(RATING_AGGREGATE_FLUSH_SIZE=2):
+            self.rate(self.users[0], 5)
+            self.rate(self.users[1], 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_ratings, 2)
+        self.assertEqual(rating_aggregates.get_stats()["pending_hits"], 0)
+
+    def test_invalid_and_anonymous_submissions(self):
+        self.assertEqual(self.rate(self.users[0], 6).status_code, 400)
+        self.client.force_authenticate(None)
+        response = self.client.post(
+            f"/api/product/{self.product.id}/ratings/", {"rating": 5}
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.rate(self.users[0], 5).status_code, 201)
+        self.product.delete()
+        self.assertEqual(rating_aggregates.flush(), 1)
+
+
+class ReportQueueTest(APITestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@gmail.com", password="admin1234"
+        )
+        self.reporter = User.objects.create_user(
+            username="shopper", password="pass1234"
+        )
+        self.product = Product.objects.create(name="Lamp", price=40)
+        self.client.force_authenticate(self.admin_user)
+
+    def report(self, title, report_type="PRODUCT", status="PENDING", product=None):
+        return Report.objects.create(
+            user=self.reporter,
+            product=product,
+            report_type=report_type,
+            title=title,
+            description="...",
+            status=status,
+        )
+
+    def titles(self, response):
+        return [item["title"] for item in response.data["results"]]
+
+    def test_queue_pages_one_status_oldest_first(self):
+        for i in range(5):
+            self.report(f"open {i}")
+        self.report("done", status="RESOLVED")
+
+        titles = []
+        url = "/api/reports/?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            titles += self.titles(response)
+            url = response.data["next"]
+        self.assertEqual(titles, [f"open {i}" for i in range(5)])
+
+        response = self.client.get("/api/reports/?status=resolved")
+        self.assertEqual(self.titles(response), ["done"])
+        self.assertEqual(response.data["results"][0]["user_name"], "shopper")
+
+    def test_queue_filters_by_type_and_product(self):
+        self.report("broken", product=self.product)
+        self.report("late seller", report_type="SELLER", product=self.product)
+        self.report("other product")
+
+        response = self.client.get(f"/api/reports/?product={self.product.id}")
+        self.assertEqual(self.titles(response), ["broken", "late seller"])
+        response = self.client.get(
+            f"/api/reports/?product={self.product.id}&report_type=seller"
+        )
+        self.assertEqual(self.titles(response), ["late seller"])
+
+        self.assertEqual(self.client.get("/api/reports/?status=lost").status_code, 400)
+        self.assertEqual(self.client.get("/api/reports/?product=lamp").status_code, 400)
+
+    def test_bulk_transition_is_one_update(self):
+        pending = [self.report(f"open {i}").id for i in range(3)]
+        closed = self.report("closed", status="CLOSED").id
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/reports/transition/",
+                {"ids": pending + [closed, 999999], "status": "RESOLVED"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"updated": 3, "skipped": 2})
+        updates = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("UPDATE")
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            set(Report.objects.filter(status="RESOLVED").values_list("id", flat=True)),
+            set(pending),
+        )
+        self.assertEqual(Report.objects.get(pk=closed).status, "CLOSED")
+
+        response = self.client.post(
+            "/api/reports/transition/", {"ids": [], "status": "DONE"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {"ids", "status"})
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.reporter)
+        self.assertEqual(self.client.get("/api/reports/").status_code, 403)
+        response = self.client.post(
+            "/api/reports/transition/", {"ids": [1], "status": "CLOSED"}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class ReportClusterTest(APITestCase):
+
+    complaint = (
+        "The charger that came with this laptop gets extremely hot after ten "
+        "minutes of use and the plastic around the plug has started to melt "
+        "so I stopped using it and want a replacement or a refund"
+    )
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@gmail.com", password="admin1234"
+        )
+        self.laptop = Product.objects.create(name="Laptop", price=900)
+        self.phone = Product.objects.create(name="Phone", price=500)
+        self.client.force_authenticate(self.admin_user)
+
+    def report(self, description, product=None, title="Charger overheats"):
+        return Report.objects.create(
+            user=self.admin_user,
+            product=product or self.laptop,
+            report_type="PRODUCT",
+            title=title,
+            description=description,
+        )
+
+    def reword(self, i):
+        words = self.complaint.split()
+        words[i * 3] = "really"
+        return " ".join(words)
+
+    def create_reports(self):
+        duplicates = [self.report(self.reword(i)) for i in range(4)]
+        other_issue = self.report(
+            "Package arrived with a dented lid and no manual inside",
+            title="Damaged box",
+        )
+        other_product = self.report(self.complaint, product=self.phone)
+        return duplicates, other_issue, other_product
+
+    def test_signatures_estimate_similarity(self):
+        signature = minhash("Charger", self.complaint)
+        self.assertEqual(similarity(signature, minhash("Charger", self.complaint)), 1)
+        self.assertGreater(
+            similarity(signature, minhash("Charger", self.reword(2))), 0.6
+        )
+        self.assertLess(similarity(signature, minhash("Colour", "Wrong colour")), 0.2)
+
+    def test_new_reports_join_clusters_of_the_same_product(self):
+        duplicates, other_issue, other_product = self.create_reports()
+        clusters = {report.cluster_id for report in duplicates}
+        self.assertEqual(len(clusters), 1)
+        self.assertNotIn(other_issue.cluster_id, clusters)
+        self.assertNotIn(other_product.cluster_id, clusters)
+        self.assertEqual(ReportCluster.objects.count(), 3)
+
+    def test_queue_lists_clusters_with_counts(self):
+        duplicates, _, _ = self.create_reports()
+        response = self.client.get("/api/reports/clusters/")
+        self.assertEqual(
+            [
+                (item["title"], item["report_count"])
+                for item in response.data["results"]
+            ],
+            [("Charger overheats", 4), ("Damaged box", 1), ("Charger overheats", 1)],
+        )
+
+        response = self.client.get(f"/api/reports/clusters/?product={self.phone.id}")
+        self.assertEqual(len(response.data["results"]), 1)
+
+        # drill into a cluster and resolve it as a whole
+        cluster = duplicates[0].cluster_id
+        response = self.client.get(f"/api/reports/?cluster={cluster}")
+        ids = [item["id"] for item in response.data["results"]]
+        self.assertEqual(sorted(ids), sorted(report.id for report in duplicates))
+        self.client.post(
+            "/api/reports/transition/",
+            {"ids": ids, "status": "RESOLVED"},
+            format="json",
+        )
+        response = self.client.get("/api/reports/clusters/")
+        self.assertEqual(len(response.data["results"]), 2)
+        response = self.client.get("/api/reports/clusters/?status=resolved")
+        self.assertEqual(response.data["results"][0]["report_count"], 4)
+
+    def test_rebuild_clusters_bulk_created_reports(self):
+        self.create_reports()
+        Report.objects.bulk_create(
+            Report(
+                user=self.admin_user,
+                product=self.laptop,
+                report_type="PRODUCT",
+                title="Charger overheats",
+                description=self.reword(i),
+            )
+            for i in range(4, 7)
+        )
+        self.assertEqual(Report.objects.filter(cluster=None).count(), 3)
+
+        out = StringIO()
+        call_command("rebuild_report_clusters", stdout=out)
+        self.assertIn("Built 3 report clusters", out.getvalue())
+        self.assertFalse(Report.objects.filter(cluster=None).exists())
+        sizes = ReportCluster.objects.annotate(size=Count("reports"))
+        self.assertEqual(sorted(sizes.values_list("size", flat=True)), [1, 1, 7])
+
+        # the rebuilt index serves new reports as well
+        report = self.report(self.reword(7))
+        self.assertEqual(sizes.get(pk=report.cluster_id).size, 8)
+
+
+class EvidenceUploadTest(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = self.settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user(username="reporter", password="pass1234")
+        self.product = Product.objects.create(name="Charger", price=20)
+        self.client.force_authenticate(self.user)
+
+    def submit(self, evidence, **extra):
+        return self.client.post(
+            "/api/report-create/",
+            {
+                "product": self.product.id,
+                "report_type": "PRODUCT",
+                "title": "Melted plug",
+                "description": "See the video",
+                "evidence": evidence,
+                **extra,
+            },
+            format="multipart",
+        )
+
+    def scratch_files(self):
+        scratch = os.path.join(self.media_root, "blobs", "tmp")
+        return os.listdir(scratch) if os.path.isdir(scratch) else []
+
+    def test_evidence_is_streamed_into_the_blob_storage(self):
+        video = os.urandom(300 * 1024)
+        response = self.submit(
+            SimpleUploadedFile("clip.MP4", video, content_type="video/mp4"),
+            extra=SimpleUploadedFile("other.mp4", b"x", content_type="video/mp4"),
+        )
+        self.assertEqual(response.status_code, 201)
+
+        report = Report.objects.get(pk=response.data["id"])
+        self.assertEqual(report.user, self.user)
+        digest = hashlib.sha256(video).hexdigest()
+        self.assertEqual(
+            report.evidence.name, f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.mp4"
+        )
+        with report.evidence.open("rb") as stored:
+            self.assertEqual(stored.read(), video)
+        # only the evidence was kept, and nothing is left behind
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertEqual(self.scratch_files(), [])
+
+    def test_size_limit_is_enforced_while_streaming(self):
+        with self.settings(REPORT_EVIDENCE_MAX_SIZE=100 * 1024):
+            # refused from the Content-Length alone
+            response = self.submit(
+                SimpleUploadedFile(
+                    "big.mp4", b"x" * 300 * 1024, content_type="video/mp4"
+                )
+            )
+            self.assertEqual(response.status_code, 413)
+            # fits the request limit, cut off once the file passes its own
+            response = self.submit(
+                SimpleUploadedFile(
+                    "big.mp4", b"x" * 150 * 1024, content_type="video/mp4"
+                )
+            )
+            self.assertEqual(response.status_code, 413)
+        self.assertFalse(Report.objects.exists())
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(self.scratch_files(), [])
+
+    def test_content_type_is_checked_before_reading_the_file(self):
+        for name, content_type in [
+            ("notes.txt", "text/plain"),
+            ("setup.exe", "image/png"),
+        ]:
+            response = self.submit(
+                SimpleUploadedFile(name, b"data", content_type=content_type)
+            )
+            self.assertEqual(response.status_code, 415)
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_reports_without_evidence(self):
+        response = self.client.post(
+            "/api/report-create/",
+            {"report_type": "OTHER", "title": "Rude seller", "description": "..."},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data["evidence"])
+
+        self.client.force_authenticate(None)
+        response = self.client.post("/api/report-create/", {}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+
+class ProductBulkEditTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@gmail.com", password="admin1234"
+        )
+        self.desk = Product.objects.create(
+            name="Desk", price=100, quantity=5, stock=True
+        )
+        self.chair = Product.objects.create(name="Chair", price=40)
+        self.client.force_authenticate(self.admin_user)
+
+    def bulk_edit(self, *products):
+        return self.client.put(
+            "/api/product-bulk-update/", {"products": list(products)}, format="json"
+        )
+
+    def test_edits_are_written_in_one_update(self):
+        detail = self.client.get(f"/api/product/{self.desk.id}/")
+        self.assertEqual(detail.data["version"], 1)
+        token = self.client.get("/api/products/changes/").data["token"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk_edit(
+                {"id": self.desk.id, "version": 1, "price": "120.00", "quantity": 0},
+                {"id": self.chair.id, "version": 1, "description": "Oak"},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["updated"],
+            [{"id": self.desk.id, "version": 2}, {"id": self.chair.id, "version": 2}],
+        )
+        self.assertEqual(response.data["conflicts"], [])
+        updates = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "product_product"')
+        ]
+        self.assertEqual(len(updates), 1)
+
+        self.desk.refresh_from_db()
+        self.assertEqual((self.desk.price, self.desk.quantity), (120, 0))
+        self.assertFalse(self.desk.stock)
+        self.assertEqual(Product.objects.get(pk=self.chair.id).description, "Oak")
+        # bulk writes still reach the derived data
+        self.assertEqual(
+            self.client.get(f"/api/product/{self.desk.id}/").data["price"], "120.00"
+        )
+        self.assertEqual(
+            self.client.get("/api/products/", {"in_stock": "true"}).data["results"], []
+        )
+        changes = self.client.get("/api/products/changes/", {"since": token})
+        self.assertEqual(
+            {product["name"] for product in changes.data["changed"]}, {"Desk", "Chair"}
+        )
+
+    def test_conflicting_edits_are_reported_not_applied(self):
+        # someone else saved the chair after this client read it
+        self.chair.description = "Pine"
+        self.chair.save()
+        self.assertEqual(self.chair.version, 2)
+
+        response = self.bulk_edit(
+            {"id": self.desk.id, "version": 1, "price": "90.00"},
+            {"id": self.chair.id, "version": 1, "description": "Oak"},
+            {"id": 9999, "version": 1, "price": "1.00"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], [{"id": self.desk.id, "version": 2}])
+        self.assertEqual(
+            response.data["conflicts"], [{"id": self.chair.id, "version": 2}]
+        )
+        self.assertEqual(response.data["missing"], [9999])
+        self.assertEqual(Product.objects.get(pk=self.chair.id).description, "Pine")
+
+        # the single product edit checks the version as well
+        response = self.client.put(
+            f"/api/product-update/{self.desk.id}/",
+            {
+                "name": "",
+                "description": "",
+                "price": "80.00",
+                "stock": True,
+                "image": "",
+                "version": 1,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Product.objects.get(pk=self.desk.id).price, 90)
+
+    def test_bulk_writes_invalidate_again_on_commit(self):
+        before = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_edit_products({self.desk.id: {"version": 1, "price": 90}})
+            during = get_catalog_version()
+        self.assertGreater(during, before)
+        # a reader racing the transaction may have cached the old row meanwhile
+        self.assertGreater(get_catalog_version(), during)
+
+    def test_invalid_batches(self):
+        response = self.bulk_edit(
+            {"id": self.desk.id, "version": 1, "price": "1.00"},
+            {"id": self.desk.id, "version": 1, "price": "2.00"},
+        )
+        self.assertEqual(response.status_code, 400)
+        with self.settings(PRODUCT_BULK_EDIT_MAX_ITEMS=1):
+            response = self.bulk_edit(
+                {"id": self.desk.id, "version": 1}, {"id": self.chair.id, "version": 1}
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.bulk_edit().status_code, 400)
+
+        self.client.force_authenticate(None)
+        response = self.bulk_edit({"id": self.desk.id, "version": 1, "price": "1.00"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(Product.objects.get(pk=self.desk.id).version, 1)
@@ -0,0 +1,112 @@
+import mimetypes
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParser as DjangoMultiPartParser
+from django.http.multipartparser import MultiPartParserError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError, UnsupportedMediaType
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+from .storage import BlobWriter, StoredBlobFile, blob_storage
+
+CHUNK_SIZE = 64 * 1024
+# multipart framing and the other form fields of a report
+FORM_OVERHEAD = 64 * 1024
+
+
+class EvidenceTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Evidence file is too large."
+    default_code = "evidence_too_large"
+
+
+class EvidenceUploadHandler(FileUploadHandler):
+    """Streams the `evidence` file of a report straight into the blob storage.
+
+    Each chunk is hashed and written to the blob's temporary file as it
+    arrives, and the finished file is renamed to its content address, so
+    an upload is read once and never held in memory or copied. A declared
+    Content-Length or content type over the limits is refused before any
+    of the body is read, and a body that runs past the size limit is cut
+    off as soon as it does. Other file fields are dropped.
+    """
+
+    chunk_size = CHUNK_SIZE
+    evidence_field = "evidence"
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.writer = None
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        if content_length > settings.REPORT_EVIDENCE_MAX_SIZE + FORM_OVERHEAD:
+            raise EvidenceTooLarge()
+
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        super().new_file(field_name, file_name, content_type, *args, **kwargs)
+        if field_name != self.evidence_field:
+            return
+        allowed = settings.REPORT_EVIDENCE_CONTENT_TYPES
+        guessed, _ = mimetypes.guess_type(file_name)
+        if content_type not in allowed or guessed not in allowed:
+            raise UnsupportedMediaType(content_type)
+        if (self.content_length or 0) > settings.REPORT_EVIDENCE_MAX_SIZE:
+            raise EvidenceTooLarge()
+        self.discard()
+        self.writer = BlobWriter(blob_storage, file_name)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.writer is None:
+            return None
+        if start + len(raw_data) > settings.REPORT_EVIDENCE_MAX_SIZE:
+            self.discard()
+            raise EvidenceTooLarge()
+        self.writer.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.writer is None:
+            return None
+        writer, self.writer = self.writer, None
+        try:
+            name = writer.commit()
+        except BaseException:
+            writer.discard()
+            raise
+        return StoredBlobFile(
+            blob_storage, name, self.file_name, file_size, self.content_type
+        )
+
+    def upload_interrupted(self):
+        self.discard()
+
+    def upload_complete(self):
+        self.discard()
+
+    def discard(self):
+        if self.writer is not None:
+            self.writer.discard()
+            self.writer = None
+
+
+class EvidenceUploadParser(MultiPartParser):
+    """Multipart parser that stores report evidence with EvidenceUploadHandler"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta["CONTENT_TYPE"] = media_type
+        handler = EvidenceUploadHandler(request)
+        try:
+            parser = DjangoMultiPartParser(meta, stream, [handler], encoding)
+            data, files = parser.parse()
+            return DataAndFiles(data, files)
+        except MultiPartParserError as exc:
+            raise ParseError("Multipart form parse error - %s" % str(exc))
+        finally:
+            # e.g. the client went away halfway through the file
+            handler.discard()
@@ -4,8 +4,26 @@ from product import views
 
 urlpatterns = [
     path('products/', views.ProductView.as_view(), name="products-list"),
+    path('products/search/', views.ProductSearchView.as_view(), name="products-search"),
+    path('products/suggest/', views.ProductSuggestView.as_view(), name="products-suggest"),
+    path('products/cache-stats/', views.ProductCacheStatsView.as_view(), name="products-cache-stats"),
+    path('products/changes/', views.ProductChangesView.as_view(), name="products-changes"),
+    path('products/top/', views.ProductTopView.as_view(), name="products-top"),
+    path('products/export/', views.ProductExportView.as_view(), name="products-export"),
+    path('reports/', views.ReportQueueView.as_view(), name="reports-queue"),
+    path('reports/clusters/', views.ReportClusterQueueView.as_view(), name="reports-clusters"),
+    path('reports/transition/', views.ReportTransitionView.as_view(), name="reports-transition"),
+    path('reports/export/', views.ReportExportView.as_view(), name="reports-export"),
     path('product/<str:pk>/', views.ProductDetailView.as_view(), name="product-details"),
+    path('product/<str:pk>/ratings/', views.ProductRatingsView.as_view(), name="product-ratings"),
+    path('product/<str:pk>/inventory/', views.ProductInventoryView.as_view(), name="product-inventory"),
+    path('product/<str:pk>/reserve/', views.ProductReserveView.as_view(), name="product-reserve"),
+    path('reservations/<str:pk>/', views.ReservationView.as_view(), name="reservation"),
+    path('reservations/<str:pk>/confirm/', views.ReservationConfirmView.as_view(), name="reservation-confirm"),
+    path('report-create/', views.ReportCreateView.as_view(), name="report-create"),
     path('product-create/', views.ProductCreateView.as_view(), name="product-create"),
+    path('product-import/', views.ProductImportView.as_view(), name="product-import"),
     path('product-update/<str:pk>/', views.ProductEditView.as_view(), name="product-update"),
+    path('product-bulk-update/', views.ProductBulkEditView.as_view(), name="product-bulk-update"),
     path('product-delete/<str:pk>/', views.ProductDeleteView.as_view(), name="product-delete"),
 ]
\ No newline at end of file
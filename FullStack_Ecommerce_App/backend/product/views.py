@@ -1,27 +1,407 @@
-from .models import Product
+from .models import Product, Rating, Report, StockReservation
 from rest_framework import status
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from django.conf import settings
+from django.db import transaction
 from rest_framework.views import APIView
-from .serializers import ProductSerializer
+from .serializers import (
+    InventorySerializer,
+    ProductBulkEditSerializer,
+    ProductSerializer,
+    RatingSerializer,
+    ReportClusterSerializer,
+    ReportSerializer,
+    ReportTransitionSerializer,
+    StockReservationSerializer,
+)
+from .pagination import (
+    ProductCursorPagination,
+    RatingCursorPagination,
+    ReportCursorPagination,
+)
+from .cache import cache_catalog_response, product_detail_cache
+from .clustering import cluster_queue
+from .changes import changes_since, parse_sync_token
+from .counters import view_counter
+from .editing import EditConflict, bulk_edit_products
+from .search import search_products
+from .facets import facet_counts, filter_products, parse_filters
+from .exports import (
+    PRODUCT_EXPORT_FIELDS,
+    REPORT_EXPORT_FIELDS,
+    export_response,
+    parse_date_range,
+    parse_export_format,
+)
+from .images import schedule_variants
+from .inventory import (
+    confirm_reservation,
+    release_reservation,
+    reserve_stock,
+    reserved_quantity,
+    set_quantity,
+)
+from .importer import IMPORT_FORMATS, guess_format, import_products, iter_rows
+from .leaderboards import BOARDS, leaderboard
+from .moderation import parse_queue_filters, transition_reports
+from .ratings import rating_aggregates, submit_rating
+from .recommendations import similar_products
+from .suggest import suggest_index
+from .uploads import EvidenceUploadParser
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework import authentication, permissions
 from rest_framework.decorators import permission_classes
 
 
+# what a "customers also bought" entry shows of each product
+SIMILAR_PRODUCT_FIELDS = [
+    "id",
+    "name",
+    "price",
+    "image",
+    "image_variants",
+    "average_rating",
+]
+
+
+def requested_fields(request):
+    """Field names from `?fields=a,b,c`, or None to serialize every field"""
+    fields = request.query_params.get("fields")
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(",") if name.strip()]
+
+
 class ProductView(APIView):
 
+    @cache_catalog_response
     def get(self, request):
-        products = Product.objects.all()
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        fields = requested_fields(request)
+        filters = parse_filters(request.query_params)
+        products = filter_products(Product.objects.all(), **filters)
+        if fields is None or "ratings" in fields:
+            products = products.with_ratings()
+
+        paginator = ProductCursorPagination()
+        products = paginator.paginate_queryset(products, request, view=self)
+        serializer = ProductSerializer(products, many=True, fields=fields)
+        response = paginator.get_paginated_response(serializer.data)
+
+        if request.query_params.get("facets", "").lower() in ("true", "1"):
+            response.data["facets"] = facet_counts(**filters)
+        return response
 
 
 class ProductDetailView(APIView):
 
+    @cache_catalog_response
     def get(self, request, pk):
+        fields = requested_fields(request)
+        with_ratings = fields is None or "ratings" in fields
+
+        # ?ratings_limit=N inlines only the newest N ratings plus a cursor
+        # into ProductRatingsView for the rest
+        if with_ratings and "ratings_limit" in request.query_params:
+            return self.get_with_first_ratings(request, pk, fields)
+
+        if fields is None:
+            # the full product is what featured-product traffic asks for, so it
+            # goes through the per-product cache where one worker rebuilds it
+            data = product_detail_cache.get_or_build(
+                pk, lambda: self.serialize(Product.objects.with_ratings(), pk)
+            )
+            data = self.add_similar(dict(data), pk, fields)
+            return Response(data, status=status.HTTP_200_OK)
+
+        products = Product.objects.all()
+        if with_ratings:
+            products = products.with_ratings()
+        data = self.add_similar(self.serialize(products, pk, fields), pk, fields)
+        return Response(data, status=status.HTTP_200_OK)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # counted here because cached and 304 responses never reach get()
+        if request.method == "GET" and response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            view_counter.record(int(self.kwargs["pk"]))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def serialize(self, products, pk, fields=None):
+        product = products.get(id=pk)
+        return ProductSerializer(product, many=False, fields=fields).data
+
+    def add_similar(self, data, pk, fields):
+        """Append the precomputed "customers also bought" products"""
+        if fields is None or "similar" in fields:
+            data["similar"] = ProductSerializer(
+                similar_products(pk), many=True, fields=SIMILAR_PRODUCT_FIELDS
+            ).data
+        return data
+
+    def get_with_first_ratings(self, request, pk, fields):
         product = Product.objects.get(id=pk)
-        serializer = ProductSerializer(product, many=False)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        requested = fields
+        fields = [
+            name for name in fields or ProductSerializer.Meta.fields if name != "ratings"
+        ]
+        data = ProductSerializer(product, many=False, fields=fields).data
+
+        paginator = RatingCursorPagination()
+        paginator.page_size_query_param = "ratings_limit"
+        paginator.base_url = request.build_absolute_uri(
+            reverse("product-ratings", args=[product.id])
+        )
+        ratings = paginator.paginate_queryset(
+            product.ratings.select_related("user"), request, view=self
+        )
+        data["ratings"] = RatingSerializer(ratings, many=True).data
+        data["ratings_next"] = paginator.get_next_link()
+        self.add_similar(data, product.id, requested)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ProductRatingsView(APIView):
+
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    @cache_catalog_response
+    def get(self, request, pk):
+        product = get_object_or_404(Product, id=pk)
+        ratings = Rating.objects.filter(product=product).select_related("user")
+
+        paginator = RatingCursorPagination()
+        ratings = paginator.paginate_queryset(ratings, request, view=self)
+        serializer = RatingSerializer(ratings, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def post(self, request, pk):
+        """Rate a product, or change the rating already given to it"""
+        product = get_object_or_404(Product.objects.only("id"), id=pk)
+        serializer = RatingSerializer(
+            data={
+                "product": product.id,
+                "rating": request.data.get("rating"),
+                "comment": request.data.get("comment", ""),
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        rating, created = submit_rating(
+            request.user,
+            product.id,
+            serializer.validated_data["rating"],
+            serializer.validated_data.get("comment", ""),
+        )
+        return Response(
+            RatingSerializer(rating).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class ProductSearchView(APIView):
+
+    result_fields = [
+        "id",
+        "name",
+        "price",
+        "stock",
+        "image",
+        "average_rating",
+        "total_ratings",
+    ]
+
+    @cache_catalog_response
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"detail": "The 'q' query parameter is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        params = request.query_params
+        try:
+            page = max(1, int(params.get("page", 1)))
+            page_size = int(params.get("page_size", settings.PRODUCT_PAGE_SIZE))
+        except ValueError:
+            page, page_size = 1, settings.PRODUCT_PAGE_SIZE
+        page_size = max(1, min(page_size, settings.PRODUCT_MAX_PAGE_SIZE))
+
+        # one extra row tells whether there is a next page
+        matches = search_products(query, page_size + 1, (page - 1) * page_size)
+        has_next = len(matches) > page_size
+        matches = matches[:page_size]
+
+        ids = [product_id for product_id, _, _ in matches]
+        products = Product.objects.in_bulk(ids)
+        ranked = [products[product_id] for product_id in ids]
+        results = ProductSerializer(ranked, many=True, fields=self.result_fields).data
+        for item, (_, name_highlight, snippet) in zip(results, matches):
+            item["name_highlight"] = name_highlight
+            item["snippet"] = snippet
+
+        next_link = None
+        if has_next:
+            url = request.build_absolute_uri()
+            next_link = replace_query_param(url, "page", page + 1)
+        return Response(
+            {"next": next_link, "results": results}, status=status.HTTP_200_OK
+        )
+
+
+class ProductSuggestView(APIView):
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, settings.SUGGEST_MAX_RESULTS))
+
+        results = suggest_index.suggest(request.query_params.get("prefix", ""), limit)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class ProductTopView(APIView):
+
+    @cache_catalog_response
+    def get(self, request):
+        """Top rated or trending products, read from the materialized scores"""
+        board = request.query_params.get("board", "top_rated")
+        if board not in BOARDS:
+            return Response(
+                {"detail": "Board must be one of: %s." % ", ".join(BOARDS)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, settings.LEADERBOARD_MAX_RESULTS))
+
+        # ratings are left out unless asked for: a board is a compact list
+        fields = requested_fields(request) or [
+            name for name in ProductSerializer.Meta.fields if name != "ratings"
+        ]
+        scores = leaderboard(board, limit)
+        results = []
+        for score in scores:
+            data = ProductSerializer(score.product, fields=fields).data
+            data["score"] = score.trending if board == "trending" else score.top_rated
+            results.append(data)
+        return Response({"board": board, "results": results}, status=status.HTTP_200_OK)
+
+
+class ProductChangesView(APIView):
+
+    @cache_catalog_response
+    def get(self, request):
+        """Products changed and deleted since the client's last sync token"""
+        params = request.query_params
+        since = parse_sync_token(params)
+        try:
+            limit = int(params.get("limit", settings.PRODUCT_CHANGES_PAGE_SIZE))
+        except ValueError:
+            limit = settings.PRODUCT_CHANGES_PAGE_SIZE
+        limit = max(1, min(limit, settings.PRODUCT_CHANGES_MAX_PAGE_SIZE))
+
+        changed, deleted, token, more = changes_since(since, limit)
+        # ratings change without touching the product row, so they are
+        # fetched from ProductRatingsView instead
+        fields = requested_fields(request) or [
+            name for name in ProductSerializer.Meta.fields if name != "ratings"
+        ]
+        return Response(
+            {
+                "token": str(token),
+                "more": more,
+                "changed": ProductSerializer(changed, many=True, fields=fields).data,
+                "deleted": deleted,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ProductCacheStatsView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        # counters are per worker process
+        return Response(
+            {
+                "product_detail": product_detail_cache.get_stats(),
+                "suggest_index": suggest_index.get_stats(),
+                "view_counter": view_counter.get_stats(),
+                "rating_aggregates": rating_aggregates.get_stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ProductInventoryView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, pk):
+        product = get_object_or_404(Product.objects.only("quantity"), pk=pk)
+        return Response(
+            {"quantity": product.quantity, "reserved": reserved_quantity(pk)},
+            status=status.HTTP_200_OK,
+        )
+
+    def put(self, request, pk):
+        get_object_or_404(Product.objects.only("id"), pk=pk)
+        serializer = InventorySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        set_quantity(pk, serializer.validated_data["quantity"])
+        return self.get(request, pk)
+
+
+class ProductReserveView(APIView):
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        """Hold units of a product for checkout"""
+        product = get_object_or_404(Product.objects.only("id"), pk=pk)
+        serializer = StockReservationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reservation = reserve_stock(
+            product.id, serializer.validated_data["quantity"], user=request.user
+        )
+        return Response(
+            StockReservationSerializer(reservation).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class ReservationView(APIView):
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_reservation(self, request, pk):
+        reservations = StockReservation.objects.all()
+        if not request.user.is_staff:
+            reservations = reservations.filter(user=request.user)
+        return get_object_or_404(reservations, pk=pk)
+
+    def delete(self, request, pk):
+        """Cancel a reservation and hand its units back"""
+        release_reservation(self.get_reservation(request, pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ReservationConfirmView(ReservationView):
+
+    def post(self, request, pk):
+        """Turn a reservation into a sale once the order is paid"""
+        confirm_reservation(self.get_reservation(request, pk))
+        return Response({"detail": "Reservation confirmed."}, status=status.HTTP_200_OK)
 
 
 class ProductCreateView(APIView):
@@ -36,18 +416,159 @@ class ProductCreateView(APIView):
             "name": data["name"],
             "description": data["description"],
             "price": data["price"],
-            "stock": data["stock"],
+            "quantity": data.get("quantity", 0),
             "image": data["image"],
         }
 
         serializer = ProductSerializer(data=product, many=False)
         if serializer.is_valid():
-            serializer.save()
+            schedule_variants(serializer.save())
             return Response(serializer.data, status=status.HTTP_200_OK)
         else:
             return Response({"detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ProductImportView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"detail": "Upload a CSV or JSONL file as 'file'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fmt = request.data.get("format") or guess_format(upload.name)
+        if fmt not in IMPORT_FORMATS:
+            return Response(
+                {"detail": "Format must be one of: %s." % ", ".join(IMPORT_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # the upload is read row by row straight from Django's upload file
+        rows = iter_rows(upload.file, fmt)
+        report = import_products(rows, settings.IMPORT_BATCH_SIZE)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class ProductExportView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """Stream the catalog as CSV or JSONL, filtered like the listing"""
+        fmt = parse_export_format(request.query_params)
+        filters = parse_filters(request.query_params)
+        products = filter_products(Product.objects.all(), **filters)
+        return export_response(products, PRODUCT_EXPORT_FIELDS, fmt, "products")
+
+
+class ReportExportView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """Stream reports as CSV or JSONL, optionally by creation date and status"""
+        params = request.query_params
+        fmt = parse_export_format(params)
+        reports = Report.objects.filter(**parse_date_range(params, "created_at"))
+        for name in ("status", "report_type"):
+            if params.get(name):
+                reports = reports.filter(**{name: params[name].upper()})
+        return export_response(reports, REPORT_EXPORT_FIELDS, fmt, "reports")
+
+
+class ReportQueueView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """Reports of one status, oldest first, by report type and product"""
+        reports = Report.objects.filter(
+            **parse_queue_filters(request.query_params)
+        ).select_related("user")
+
+        paginator = ReportCursorPagination()
+        reports = paginator.paginate_queryset(reports, request, view=self)
+        serializer = ReportSerializer(reports, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ReportCreateView(APIView):
+
+    permission_classes = [permissions.IsAuthenticated]
+    # evidence is streamed into the blob storage while the body is read
+    parser_classes = [EvidenceUploadParser, JSONParser]
+
+    def post(self, request):
+        """File a report, optionally with an evidence file"""
+        serializer = ReportSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ReportClusterQueueView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """Clusters of near-duplicate reports, with how many are in the status"""
+        clusters = cluster_queue(**parse_queue_filters(request.query_params))
+
+        paginator = ReportCursorPagination()
+        clusters = paginator.paginate_queryset(clusters, request, view=self)
+        serializer = ReportClusterSerializer(clusters, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ReportTransitionView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        """Move many reports to a new status with one UPDATE"""
+        serializer = ReportTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+        updated = transition_reports(
+            Report.objects.filter(pk__in=ids), serializer.validated_data["status"]
+        )
+        return Response(
+            {"updated": updated, "skipped": len(set(ids)) - updated},
+            status=status.HTTP_200_OK,
+        )
+
+
+class ProductBulkEditView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def put(self, request):
+        """Change price, description or units on hand of many products at once"""
+        serializer = ProductBulkEditSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated, conflicts, missing = bulk_edit_products(
+            serializer.validated_data["products"]
+        )
+        return Response(
+            {
+                "updated": [
+                    {"id": product_id, "version": version}
+                    for product_id, version in updated.items()
+                ],
+                "conflicts": [
+                    {"id": product_id, "version": version}
+                    for product_id, version in conflicts.items()
+                ],
+                "missing": missing,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class ProductDeleteView(APIView):
 
     permission_classes = [permissions.IsAdminUser]
@@ -65,21 +586,31 @@ class ProductEditView(APIView):
     
     permission_classes = [permissions.IsAdminUser]
 
+    @transaction.atomic
     def put(self, request, pk):
         data = request.data
-        product = Product.objects.get(id=pk)
-        
+        product = Product.objects.select_for_update().get(id=pk)
+        # optional: the version the edit was based on, see product.editing
+        if data.get("version") and str(data["version"]) != str(product.version):
+            raise EditConflict()
+
         updated_product = {
             "name": data["name"] if data["name"] else product.name,
             "description": data["description"] if data["description"] else product.description,
             "price": data["price"] if data["price"] else product.price,
-            "stock": data["stock"],
             "image": data["image"] if data["image"] else product.image,
         }
+        # units on hand, left as they are when not given
+        if data.get("quantity") not in (None, ""):
+            updated_product["quantity"] = data["quantity"]
 
         serializer = ProductSerializer(product, data=updated_product)
         if serializer.is_valid():
-            serializer.save()
+            if "image" in request.FILES:
+                # the old variants no longer match; new ones follow shortly
+                schedule_variants(serializer.save(image_variants={}))
+            else:
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
         else:
             return Response({"detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
@@ -35,12 +35,20 @@ export const getProductsList = () => async (dispatch) => {
             type: PRODUCTS_LIST_REQUEST
         })
 
-        // call api
-        const { data } = await axios.get("/api/products/")
+        // call api, following the cursor pages: the list page filters the
+        // whole catalog by name on the client, and only shows these fields
+        let products = []
+        let url = "/api/products/?page_size=100&fields=id,name,price,image"
+        while (url) {
+            const { data } = await axios.get(url)
+            products = products.concat(data.results)
+            // the links are absolute; keep the requests on the proxied origin
+            url = data.next ? new URL(data.next).pathname + new URL(data.next).search : null
+        }
 
         dispatch({
             type: PRODUCTS_LIST_SUCCESS,
-            payload: data
+            payload: products
         })
     } catch (error) {
         dispatch({
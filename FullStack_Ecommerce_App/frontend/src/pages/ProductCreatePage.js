@@ -16,7 +16,7 @@ const ProductCreatePage = () => {
     const [name, setName] = useState("")
     const [description, setDescription] = useState("")
     const [price, setPrice] = useState("")
-    const [stock, setStock] = useState(false)
+    const [quantity, setQuantity] = useState("0")
     const [image, setImage] = useState(null)
 
     // login reducer
@@ -45,7 +45,8 @@ const ProductCreatePage = () => {
         form_data.append('name', name)
         form_data.append('description', description)
         form_data.append('price', price)
-        form_data.append('stock', stock)
+        // "in stock" follows the units on hand
+        form_data.append('quantity', quantity)
         form_data.append('image', image)
 
         dispatch(createProduct(form_data))
@@ -128,15 +129,22 @@ const ProductCreatePage = () => {
                     </Form.Control>
                 </Form.Group>
 
-                <span style={{ display: "flex" }}>
-                    <label>In Stock</label>
-                    <input
-                        type="checkbox"
-                        value={stock}
-                        className="ml-2 mt-2"
-                        onChange={() => setStock(!stock)}
-                    />
-                </span>
+                <Form.Group controlId='quantity'>
+                    <Form.Label>
+                        <b>
+                            Units In Stock
+                        </b>
+                    </Form.Label>
+                    <Form.Control
+                        required
+                        type="number"
+                        min="0"
+                        step="1"
+                        value={quantity}
+                        onChange={(e) => setQuantity(e.target.value)}
+                    >
+                    </Form.Control>
+                </Form.Group>
 
                 <Form.Group controlId='image'>
                     <Form.Label>
@@ -27,7 +27,7 @@ const ProductUpdatePage = ({ match }) => {
     const [name, setName] = useState("")
     const [description, setDescription] = useState("")
     const [price, setPrice] = useState("")
-    const [stock, setStock] = useState(product.stock)
+    const [quantity, setQuantity] = useState("")
     const [image, setImage] = useState("")
 
     let history = useHistory()
@@ -67,7 +67,8 @@ const ProductUpdatePage = ({ match }) => {
         form_data.append('name', name)
         form_data.append('description', description)
         form_data.append('price', price)
-        form_data.append('stock', stock)
+        // empty keeps the units on hand; "in stock" follows them
+        form_data.append('quantity', quantity)
         form_data.append('image', image)
 
         dispatch(updateProduct(productId, form_data))
@@ -208,15 +209,21 @@ const ProductUpdatePage = ({ match }) => {
                     </Form.Control>
                 </Form.Group>
 
-                <span style={{ display: "flex" }}>
-                    <label>In Stock</label>
-                    <input
-                        type="checkbox"
-                        defaultChecked={product.stock}
-                        className="ml-2 mt-2"
-                        onChange={() => setStock(!stock)}
-                    />
-                </span>
+                <Form.Group controlId='quantity'>
+                    <Form.Label>
+                        <b>
+                            Units In Stock
+                        </b>
+                    </Form.Label>
+                    <Form.Control
+                        type="number"
+                        min="0"
+                        step="1"
+                        placeholder="unchanged"
+                        onChange={(e) => setQuantity(e.target.value)}
+                    >
+                    </Form.Control>
+                </Form.Group>
 
                 <Button
                     type="submit"